@@ -0,0 +1,121 @@
+"""Per-join cost of rendering a welcome: old Welcome.py path vs render plans.
+
+Run from the repository root:
+
+    python -m benchmarks.greeting_render
+"""
+import asyncio
+import time
+from datetime import datetime
+from html import escape
+from secrets import choice
+from types import SimpleNamespace
+
+from pyrogram import enums
+from pyrogram.types import ChatMemberUpdated
+
+from Bad.database.kbhelpersdb import ikb
+from Bad.database.parserdb import mention_html
+from Bad.database.stringdb import (build_keyboard, escape_invalid_curly_brackets,
+                                 parse_button)
+from utils.greeting_plan import GREETING_FIELDS, greeting_plan, render_greeting
+
+ChatType = enums.ChatType
+
+RUNS = 20000
+TEXT = (
+    "ʜᴇʏ {mention}, ᴡᴇʟᴄᴏᴍᴇ ᴛᴏ {chatname}! ʏᴏᴜ ᴀʀᴇ ᴍᴇᴍʙᴇʀ #{totalmember}"
+    "%%%ʜɪ {first}, ʀᴇᴀᴅ ᴛʜᴇ ʀᴜʟᴇꜱ 🌸"
+    "\n[Rules](buttonurl://t.me/example/1) [Support](buttonurl://t.me/example:same)"
+)
+
+
+# Verbatim copy of the helper removed from plugins/Welcome.py
+async def escape_mentions_using_curly_brackets_wl(
+    m: ChatMemberUpdated,
+    n: bool,
+    text: str,
+    parse_words: list,
+    total_members: int,
+) -> str:
+    teks = await escape_invalid_curly_brackets(text, parse_words)
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if n:
+        user = m.new_chat_member.user if m.new_chat_member else m.from_user
+    else:
+        user = m.old_chat_member.user if m.old_chat_member else m.from_user
+    if teks:
+        teks = teks.format(
+            first=escape(user.first_name),
+            last=escape(user.last_name or user.first_name),
+            fullname=" ".join(
+                [
+                    escape(user.first_name),
+                    escape(user.last_name),
+                ]
+                if user.last_name
+                else [escape(user.first_name)],
+            ),
+            username=(
+                "@" + user.username
+                if user.username
+                else (await mention_html(escape(user.first_name), user.id))
+            ),
+            mention=await mention_html(escape(user.first_name), user.id),
+            chatname=escape(m.chat.title)
+            if m.chat.type != ChatType.PRIVATE
+            else escape(user.first_name),
+            id=user.id,
+            time=current_time,  # Add the current time here
+            totalmember=total_members,  # Add the total member count here
+        )
+    else:
+        teks = ""
+
+    return teks
+
+
+user = SimpleNamespace(id=1, first_name="Ana", last_name="B", username=None)
+member = SimpleNamespace(
+    new_chat_member=SimpleNamespace(user=user),
+    old_chat_member=None,
+    from_user=user,
+    chat=SimpleNamespace(id=0, title="Test <chat>", type=ChatType.SUPERGROUP),
+)
+
+
+async def count_members():
+    # Both paths get the same constant; the old one made an API call per join
+    return 100
+
+
+async def legacy():
+    # The per-join steps of the old greet_new_members
+    total_members = await count_members()
+    hmm = await escape_mentions_using_curly_brackets_wl(member, True, TEXT, GREETING_FIELDS, total_members)
+    tek, button = await parse_button(hmm)
+    button = await build_keyboard(button)
+    button = ikb(button) if button else None
+    if "%%%" in tek:
+        filter_reply = tek.split("%%%")
+        teks = choice(filter_reply)
+    else:
+        teks = tek
+    return teks, button
+
+
+async def planned():
+    plan = await greeting_plan(member.chat.id, "welcome", TEXT, "")
+    return await render_greeting(plan, [member], True, count_members)
+
+
+async def main():
+    for name, render in (("legacy", legacy), ("plan", planned)):
+        start = time.perf_counter()
+        for _ in range(RUNS):
+            await render()
+        print(f"{name:>6}: {(time.perf_counter() - start) / RUNS * 1e6:.1f} µs/join")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,6 @@
+import asyncio
+
+import config
 from Bad import app
 from Bad.core.mongo import mongodb
 from pyrogram import filters
@@ -5,43 +8,51 @@ from pyrogram.types import Message
 from datetime import datetime, timedelta
 from pyrogram.types import ChatPermissions, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import UserAdminInvalid
-from pyrogram.enums import ChatMemberStatus
-from utils.permissions import adminsOnly, member_permissions
+from utils.batcher import DELETE_BATCH_SIZE, ChatBatcher
+from utils.gateway import MODERATION, gateway
+from utils.flood_store import FLOOD_ENGINES, FloodStore, check_flood, remember_message
+from utils.sketch import DecayingCountMinSketch
+from utils.callbacks import callback_router
+from utils.permissions import is_admin
+from utils.raid import raid_monitor
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, ChatPermissions
-from pyrogram.enums import ChatMemberStatus
-from pyrogram.errors import UserNotParticipant, UserAdminInvalid
+from pyrogram.errors import UserAdminInvalid
 
 
 antiflood_collection = mongodb.antiflood_settings
 DEFAULT_FLOOD_ACTION = "tmute"
+DEFAULT_FLOOD_ENGINE = "fixed"
+
+# chat_id -> settings; chats without a document cache the defaults too
+_flood_settings_cache = {}
 
 async def get_chat_flood_settings(chat_id):
+    cached = _flood_settings_cache.get(chat_id)
+    if cached is not None:
+        return cached
     settings = await antiflood_collection.find_one({"chat_id": chat_id})
     if not settings:
-        return {
-            "flood_limit": 0,
-            "flood_timer": 0,
-            "flood_action": DEFAULT_FLOOD_ACTION,
-            "delete_flood": False
-        }
-    return {
+        settings = {}
+    settings = {
         "flood_limit": settings.get("flood_limit", 0),
         "flood_timer": settings.get("flood_timer", 0),
         "flood_action": settings.get("flood_action", DEFAULT_FLOOD_ACTION),
-        "delete_flood": settings.get("delete_flood", False)
+        "delete_flood": settings.get("delete_flood", False),
+        "flood_engine": settings.get("flood_engine", DEFAULT_FLOOD_ENGINE)
     }
+    _flood_settings_cache[chat_id] = settings
+    return settings
 
-def update_chat_flood_settings(chat_id, update_data):
-    antiflood_collection.update_one({"chat_id": chat_id}, {"$set": update_data}, upsert=True)
+async def update_chat_flood_settings(chat_id, update_data):
+    settings = dict(await get_chat_flood_settings(chat_id))
+    settings.update(update_data)
+    _flood_settings_cache[chat_id] = settings
+    await antiflood_collection.update_one({"chat_id": chat_id}, {"$set": update_data}, upsert=True)
 
 async def check_admin_rights(client, message: Message):
-    try:
-        participant = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if participant.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER):
-            return True
-    except UserNotParticipant:
-        pass
+    if await is_admin(message.chat.id, message.from_user.id):
+        return True
     await message.reply("**You are not an admin.**")
     return False
 
@@ -56,7 +67,8 @@ async def get_flood_settings(client, message: Message):
         f"Flood Limit: {settings['flood_limit']}\n"
         f"Flood Timer: {settings['flood_timer']} seconds\n"
         f"Flood Action: {settings['flood_action']}\n"
-        f"Delete Flood Messages: {settings['delete_flood']}"
+        f"Delete Flood Messages: {settings['delete_flood']}\n"
+        f"Flood Engine: {settings['flood_engine']}"
     )
 
 @app.on_message(filters.command("setflood"))
@@ -73,15 +85,19 @@ async def set_flood_limit(client, message: Message):
     flood_limit = command_args[0].lower()
     
     if flood_limit in ["off", "no", "0"]:
-        update_chat_flood_settings(chat_id, {"flood_limit": 0})
+        await update_chat_flood_settings(chat_id, {"flood_limit": 0})
         await message.reply("Antiflood has been disabled.")
     else:
         try:
             flood_limit = int(flood_limit)
-            update_chat_flood_settings(chat_id, {"flood_limit": flood_limit})
-            await message.reply(f"Flood limit set to {flood_limit} consecutive messages.")
         except ValueError:
             await message.reply("Invalid flood limit. Please provide a valid number or 'off'.")
+            return
+        if flood_limit < 1:
+            await message.reply("Flood limit must be a positive number, or 'off' to disable it.")
+            return
+        await update_chat_flood_settings(chat_id, {"flood_limit": flood_limit})
+        await message.reply(f"Flood limit set to {flood_limit} consecutive messages.")
 
 @app.on_message(filters.command("setfloodtimer"))
 async def set_flood_timer(client, message: Message):
@@ -91,7 +107,7 @@ async def set_flood_timer(client, message: Message):
     command_args = message.command[1:]
     
     if len(command_args) == 0 or command_args[0].lower() in ["off", "no"]:
-        update_chat_flood_settings(chat_id, {"flood_timer": 0})
+        await update_chat_flood_settings(chat_id, {"flood_timer": 0})
         await message.reply("Timed antiflood has been disabled.")
         return
 
@@ -102,10 +118,14 @@ async def set_flood_timer(client, message: Message):
     try:
         count = int(command_args[0])
         duration = int(command_args[1].replace('s', ''))
-        update_chat_flood_settings(chat_id, {"flood_timer": duration, "flood_limit": count})
-        await message.reply(f"Flood timer set to {count} messages in {duration} seconds.")
     except ValueError:
         await message.reply("Invalid timer settings. Please provide a valid number.")
+        return
+    if count < 1 or duration < 1:
+        await message.reply("Message count and duration must both be positive numbers.")
+        return
+    await update_chat_flood_settings(chat_id, {"flood_timer": duration, "flood_limit": count})
+    await message.reply(f"Flood timer set to {count} messages in {duration} seconds.")
 
 @app.on_message(filters.command("floodmode"))
 async def set_flood_mode(client, message: Message):
@@ -123,9 +143,25 @@ async def set_flood_mode(client, message: Message):
         await message.reply("Invalid action. Choose from ban/mute/kick/tban/tmute.")
         return
     
-    update_chat_flood_settings(chat_id, {"flood_action": action})
+    await update_chat_flood_settings(chat_id, {"flood_action": action})
     await message.reply(f"Flood action set to {action}.")
 
+@app.on_message(filters.command("floodengine"))
+async def set_flood_engine(client, message: Message):
+    if not await check_admin_rights(client, message):
+        return
+    chat_id = message.chat.id
+    command_args = message.command[1:]
+    engines = "/".join(FLOOD_ENGINES)
+
+    if len(command_args) == 0 or command_args[0].lower() not in FLOOD_ENGINES:
+        await message.reply(f"Please choose a valid engine ({engines}).")
+        return
+
+    engine = command_args[0].lower()
+    await update_chat_flood_settings(chat_id, {"flood_engine": engine})
+    await message.reply(f"Flood engine set to {engine}.")
+
 @app.on_message(filters.command("clearflood"))
 async def set_flood_clear(client, message: Message):
     if not await check_admin_rights(client, message):
@@ -138,47 +174,114 @@ async def set_flood_clear(client, message: Message):
         return
     
     delete_flood = command_args[0].lower() in ["yes", "on"]
-    update_chat_flood_settings(chat_id, {"delete_flood": delete_flood})
+    await update_chat_flood_settings(chat_id, {"delete_flood": delete_flood})
     await message.reply(f"Delete flood messages set to {delete_flood}.")
 
-flood_count = {}
+# While a chat is in raid mode, offenders are muted in periodic passes
+# with one summary message instead of one action and reply each
+RAID_PASS_INTERVAL = getattr(config, "RAID_PASS_INTERVAL", 5)
+RAID_MUTE_MINUTES = getattr(config, "RAID_MUTE_MINUTES", 10)
+
+async def raid_restrict_pass(chat_id, user_ids):
+    until_date = datetime.now() + timedelta(minutes=RAID_MUTE_MINUTES)
+    results = await asyncio.gather(
+        *(
+            gateway.queue(MODERATION, chat_id, app.restrict_chat_member, chat_id, user_id, permissions=ChatPermissions(can_send_messages=False), until_date=until_date)
+            for user_id in set(user_ids)
+        ),
+        return_exceptions=True,
+    )
+    muted = sum(1 for result in results if not isinstance(result, Exception))
+    if muted:
+        await gateway.queue(MODERATION, chat_id, app.send_message, chat_id, f"**Raid mode: muted {muted} users for {RAID_MUTE_MINUTES} minutes for flooding.**")
+
+flood_store = FloodStore()
+flood_deleter = ChatBatcher(
+    lambda chat_id, message_ids: gateway.queue(MODERATION, chat_id, app.delete_messages, chat_id, message_ids)
+)
+raid_restrictor = ChatBatcher(raid_restrict_pass, interval=RAID_PASS_INTERVAL, batch_size=None)
+
+# Cross-chat rate: a user's decayed count in all chats minus the count in
+# the current chat, so a chat's own limit stays the only per-chat cap.
+# Counts halve every GLOBAL_FLOOD_HALF_LIFE seconds, so the limit trips
+# at a steady rate between GLOBAL_FLOOD_LIMIT / 2 and GLOBAL_FLOOD_LIMIT
+# messages per half-life sent in the user's other chats
+GLOBAL_FLOOD_LIMIT = getattr(config, "GLOBAL_FLOOD_LIMIT", 40)
+GLOBAL_FLOOD_HALF_LIFE = getattr(config, "GLOBAL_FLOOD_HALF_LIFE", 60)
+global_flood_sketch = DecayingCountMinSketch(half_life=GLOBAL_FLOOD_HALF_LIFE)
+# Keyed by (chat, user); collisions only overestimate, which lowers the
+# cross-chat figure rather than raising it
+chat_flood_sketch = DecayingCountMinSketch(width=16384, half_life=GLOBAL_FLOOD_HALF_LIFE)
 
 @app.on_message(filters.group, group=31)
 async def flood_detector(client, message: Message):
     try:
+        if not message.from_user:
+            return
         chat_id = message.chat.id
-
         user_id = message.from_user.id
+        other_chats_rate = global_flood_sketch.add(user_id) - chat_flood_sketch.add(
+            hash((chat_id, user_id))
+        )
         settings = await get_chat_flood_settings(chat_id)
-        participant = await client.get_chat_member(message.chat.id, message.from_user.id)
-        if participant.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER):
+        if settings['flood_limit'] < 1:
             return
 
-        if settings['flood_limit'] == 0:
-            return
+        # Count in memory first; only senders over the limit cost a lookup
+        # Without a timer the limit applies to messages sent within a second
+        window = max(settings['flood_timer'], 1)
+        record = flood_store.get(chat_id, user_id, window=window)
+        engine = FLOOD_ENGINES.get(settings['flood_engine'], FLOOD_ENGINES[DEFAULT_FLOOD_ENGINE])
+        now = record.seen
+        burst = None
+        if settings['delete_flood']:
+            size = min(settings['flood_limit'] + 1, DELETE_BATCH_SIZE)
+            burst = remember_message(record, message.id, size)
 
-        if chat_id not in flood_count:
-            flood_count[chat_id] = {}
+        flooding = check_flood(record, engine, now, settings['flood_limit'], window)
+        if not flooding and other_chats_rate <= GLOBAL_FLOOD_LIMIT:
+            return
+        if now >= record.exempt_until:
+            record.exempt = await is_admin(chat_id, user_id)
+            record.exempt_until = now + window
+        if record.exempt:
+            return
 
-        user_flood_data = flood_count[chat_id].get(user_id, {"count": 0, "first_message_time": datetime.now()})
-        flood_timer = settings.get('flood_timer', 0)
+        if now < record.acted_until:
+            # Already dealt with in this window, just sweep the extra messages
+            if burst:
+                flood_deleter.add(chat_id, burst)
+                burst.clear()
+            return
+        record.acted_until = now + window
 
-        if (datetime.now() - user_flood_data['first_message_time']).seconds > flood_timer:
-            user_flood_data = {"count": 1, "first_message_time": datetime.now()}
-        else:
-            user_flood_data['count'] += 1
+        if raid_monitor.record_flood(chat_id):
+            raid_restrictor.add(chat_id, [user_id])
+            if burst:
+                flood_deleter.add(chat_id, burst)
+                burst.clear()
+            return
 
-        flood_count[chat_id][user_id] = user_flood_data
+        action = settings['flood_action']
+        await take_flood_action(client, message, action)
 
-        if user_flood_data['count'] > settings['flood_limit']:
-            action = settings['flood_action']
-            await take_flood_action(client, message, action)
+        if burst:
+            gateway.submit(MODERATION, chat_id, app.delete_messages, chat_id, list(burst))
+            burst.clear()
 
-            if settings['delete_flood']:
-                await message.delete()
-                
     except Exception as e:
         print(f"An error occurred in flood_detector: {e}")
+async def _moderate(chat_id, func, *args, **kwargs):
+    """Wait a bounded time for a moderation call whose errors matter.
+
+    If the MODERATION lane is paused by a FloodWait the call stays queued
+    and goes out later; the handler doesn't wait for it.
+    """
+    try:
+        await gateway.call(MODERATION, chat_id, func, *args, **kwargs)
+    except asyncio.TimeoutError:
+        pass
+
 async def take_flood_action(client, message, action):
     user_id = message.from_user.id
     chat_id = message.chat.id
@@ -189,7 +292,7 @@ async def take_flood_action(client, message, action):
     
     if action == "ban":
         try:
-            await client.ban_chat_member(chat_id, user_id)
+            await _moderate(chat_id, client.ban_chat_member, chat_id, user_id)
             buttons = InlineKeyboardMarkup(
                 [[InlineKeyboardButton("Unban", callback_data=f"unban:{user_id}")]]
             )
@@ -197,7 +300,7 @@ async def take_flood_action(client, message, action):
             return 
     elif action == "mute":
         try:
-            await client.restrict_chat_member(chat_id, user_id, permissions=ChatPermissions(can_send_messages=False))
+            await _moderate(chat_id, client.restrict_chat_member, chat_id, user_id, permissions=ChatPermissions(can_send_messages=False))
             buttons = InlineKeyboardMarkup(
                 [[InlineKeyboardButton("Unmute", callback_data=f"unmute:{user_id}")]]
             )
@@ -205,8 +308,8 @@ async def take_flood_action(client, message, action):
             return 
     elif action == "kick":
         try:
-            await client.kick_chat_member(chat_id, user_id)
-            await client.unban_chat_member(chat_id, user_id)
+            await _moderate(chat_id, client.kick_chat_member, chat_id, user_id)
+            await _moderate(chat_id, client.unban_chat_member, chat_id, user_id)
             buttons = InlineKeyboardMarkup(
                 [[InlineKeyboardButton("View Profile", url=f"tg://user?id={user_id}")]]
             )
@@ -215,7 +318,7 @@ async def take_flood_action(client, message, action):
     elif action == "tban":
         try:
             until_date = datetime.now() + timedelta(minutes=1)
-            await client.ban_chat_member(chat_id, user_id, until_date=until_date)
+            await _moderate(chat_id, client.ban_chat_member, chat_id, user_id, until_date=until_date)
             buttons = InlineKeyboardMarkup(
                 [[InlineKeyboardButton("Unban", callback_data=f"unban:{user_id}")]]
             )
@@ -224,53 +327,43 @@ async def take_flood_action(client, message, action):
     elif action == "tmute":
         try:
             until_date = datetime.now() + timedelta(minutes=1)
-            await client.restrict_chat_member(chat_id, user_id, permissions=ChatPermissions(can_send_messages=False), until_date=until_date)
+            await _moderate(chat_id, client.restrict_chat_member, chat_id, user_id, permissions=ChatPermissions(can_send_messages=False), until_date=until_date)
             buttons = InlineKeyboardMarkup(
                 [[InlineKeyboardButton("Unmute", callback_data=f"unmute:{user_id}")]]
             )
         except UserAdminInvalid:
             return
 
-    await message.reply(f"**User {user_first_name} was {action}ed for flooding.**", reply_markup=buttons)
+    gateway.submit(MODERATION, chat_id, message.reply, f"**User {user_first_name} was {action}ed for flooding.**", reply_markup=buttons)
 
 
 
-@app.on_callback_query()
-async def callback_handler(client: Client, callback_query: CallbackQuery):
+@callback_router.route("unban:", permission="can_restrict_members")
+async def unban_callback(client: Client, callback_query: CallbackQuery):
     chat_id = callback_query.message.chat.id
+    user_id = int(callback_query.data.split(":")[1])
     try:
-        permissions = await member_permissions(chat_id, callback_query.from_user.id)
-        permission = "can_restrict_members"
-        if permission not in permissions:
-            return await callback_query.answer(
-            "ʏᴏᴜ ᴅᴏɴ'ᴛ ʜᴀᴠᴇ ᴇɴᴏᴜɢʜ ᴘᴇʀᴍɪssɪᴏɴs ᴛᴏ ᴘᴇʀғᴏʀᴍ ᴛʜɪs ᴀᴄᴛɪᴏɴ\n"
-            + f"ᴘᴇʀᴍɪssɪᴏɴ ɴᴇᴇᴅᴇᴅ: {permission}",
-            show_alert=True,
-        )
-    except UserNotParticipant:
-        await callback_query.answer("You are not a participant in this chat.", show_alert=True)
-        return
+        await gateway.call(MODERATION, chat_id, client.unban_chat_member, chat_id, user_id)
+        await callback_query.answer("User unbanned!", show_alert=True)
+        gateway.submit(MODERATION, chat_id, callback_query.message.delete)
+    except UserAdminInvalid:
+        await callback_query.answer("Failed to unban user, maybe they are an admin.", show_alert=True)
+    except asyncio.TimeoutError:
+        await callback_query.answer("Rate limited by Telegram, the unban will go through shortly.", show_alert=True)
 
-    data = callback_query.data
+
+@callback_router.route("unmute:", permission="can_restrict_members")
+async def unmute_callback(client: Client, callback_query: CallbackQuery):
     chat_id = callback_query.message.chat.id
-    
-    if data.startswith("unban:"):
-        user_id = int(data.split(":")[1])
-        try:
-            await client.unban_chat_member(chat_id, user_id)
-            await callback_query.answer("User unbanned!", show_alert=True)
-            await callback_query.message.delete()
-        except UserAdminInvalid:
-            await callback_query.answer("Failed to unban user, maybe they are an admin.", show_alert=True)
-            
-    elif data.startswith("unmute:"):
-        user_id = int(data.split(":")[1])
-        try:
-            await client.restrict_chat_member(chat_id, user_id, permissions=ChatPermissions(can_send_messages=True))
-            await callback_query.answer("User unmuted!", show_alert=True)
-            await callback_query.message.delete()
-        except UserAdminInvalid:
-            await callback_query.answer("Failed to unmute user, maybe they are an admin.", show_alert=True)
+    user_id = int(callback_query.data.split(":")[1])
+    try:
+        await gateway.call(MODERATION, chat_id, client.restrict_chat_member, chat_id, user_id, permissions=ChatPermissions(can_send_messages=True))
+        await callback_query.answer("User unmuted!", show_alert=True)
+        gateway.submit(MODERATION, chat_id, callback_query.message.delete)
+    except UserAdminInvalid:
+        await callback_query.answer("Failed to unmute user, maybe they are an admin.", show_alert=True)
+    except asyncio.TimeoutError:
+        await callback_query.answer("Rate limited by Telegram, the unmute will go through shortly.", show_alert=True)
 
 
 __MODULE__ = "ᴀɴᴛɪғʟᴏᴏᴅ"
@@ -282,6 +375,7 @@ __HELP__ = """
 » `/setfloodtimer <count> <duration>` - ᴛɪᴍᴇᴅ ᴀɴᴛɪғʟᴏᴏᴅ ꜱᴇᴛᴛɪɴɢ.
 » `/floodmode <ban/mute/kick/tban/tmute>` - ᴀᴄᴛɪᴏɴ ᴏɴ ᴀɴʏ ᴠɪᴏʟᴀᴛᴏʀ.
 » `/clearflood <yes/no/on/off>` - ᴅᴇʟᴇᴛᴇ ꜰʟᴏᴏᴅ ᴍᴇꜱꜱᴀɢᴇꜱ ᴀᴜᴛᴏᴍᴀᴛɪᴄᴀʟʟʏ.
+» `/floodengine <fixed/sliding/bucket>` - ᴄʜᴏᴏꜱᴇ ʜᴏᴡ ᴍᴇꜱꜱᴀɢᴇꜱ ᴀʀᴇ ᴄᴏᴜɴᴛᴇᴅ.
 
 **<u>📍ᴇxᴀᴍᴘʟᴇꜱ</u>**
 » `/setflood 7` - ᴀᴄᴛɪᴠᴀᴛᴇ ᴀɴᴛɪғʟᴏᴏᴅ ᴀꜰᴛᴇʀ 7 ᴍꜱɢꜱ.
@@ -1,10 +1,12 @@
+import csv
 from html import escape
-import re
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMember
+from io import BytesIO, TextIOWrapper
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 )
 
+import config
 from config import OWNER_ID
 from Bad import application
 from Bad.logging import LOGGERR
@@ -12,21 +14,70 @@ from Bad.logging import LOGGERR
 from Bad.database.blacklist_db import Blacklist
 from Bad.database.kbhelpersdb import ikb
 from Bad.database.permissionsdb import adminsOnly
+from utils.async_db import run_sync
+from utils.batcher import ChatBatcher
+from utils.blacklist import AsyncBlacklist
+from utils.blacklist_packs import (
+    add_pack_words, chat_pack_matchers, list_packs, pack_exists,
+    remove_pack_words, subscribe, subscribed_packs, unsubscribe, valid_pack_name
+)
+from utils.enforcement import ActionLedger
+from utils.gateway import MODERATION, gateway
+from utils.permissions import is_admin, is_owner
+from utils.singleflight import single_flight
+from utils.textfold import fold_text
+from utils.wordmatch import compile_matcher
 
 app_instance = application  # as per your request
 
+MAX_IMPORT_BYTES = 1024 * 1024
+MAX_WORD_LENGTH = 100
+
+# Ban/mute/warn a user at most once per BLACKLIST_ACTION_TTL seconds per chat
+BLACKLIST_ACTION_TTL = getattr(config, "BLACKLIST_ACTION_TTL", 60)
+enforcement_ledger = ActionLedger(ttl=BLACKLIST_ACTION_TTL)
+blacklist_deleter = ChatBatcher(
+    lambda chat_id, message_ids: gateway.queue(
+        MODERATION, chat_id, app_instance.bot.delete_messages, chat_id, message_ids
+    )
+)
+
+# Compiled matchers per chat, rebuilt only when the chat's version changes
+_blacklist_versions = {}
+_blacklist_matchers = {}
+
+def bump_blacklist_version(chat_id: int):
+    _blacklist_versions[chat_id] = _blacklist_versions.get(chat_id, 0) + 1
+
+def _read_blacklist_matcher(chat_id: int, version: int):
+    db = Blacklist(chat_id)
+    return (version, compile_matcher(fold_text(word) for word in db.get_blacklists()), db.get_action(), db.get_reason())
+
+async def _load_blacklist_matcher(chat_id: int, version: int):
+    cached = await run_sync(_read_blacklist_matcher, chat_id, version)
+    _blacklist_matchers[chat_id] = cached
+    return cached
+
+async def get_blacklist_matcher(chat_id: int):
+    """Return (version, matcher or None, action, reason) for a chat."""
+    version = _blacklist_versions.get(chat_id, 0)
+    cached = _blacklist_matchers.get(chat_id)
+    if cached and cached[0] == version:
+        return cached
+    return await single_flight(
+        ("blacklist_matcher", chat_id, version), _load_blacklist_matcher, chat_id, version
+    )
+
 # Utility: Check if user is admin with can_restrict_members
 async def has_permission(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    chat_member = await context.bot.get_chat_member(update.effective_chat.id, user_id)
-    return chat_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+    return await is_admin(update.effective_chat.id, update.effective_user.id)
 
 # Show all blacklisted words
 async def view_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await has_permission(update, context):
         return
-    db = Blacklist(update.effective_chat.id)
-    blacklisted = db.get_blacklists()
+    db = AsyncBlacklist(update.effective_chat.id)
+    blacklisted = await db.get_blacklists()
     if not blacklisted:
         await update.message.reply_html(f"No blacklisted words in <b>{update.effective_chat.title}</b>.")
         return
@@ -40,13 +91,11 @@ async def add_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(context.args) < 1:
         await update.message.reply_text("Usage: /addblacklist <word1> <word2> ...")
         return
-    db = Blacklist(update.effective_chat.id)
+    db = AsyncBlacklist(update.effective_chat.id)
     new_words = [w.lower() for w in context.args]
-    existing = db.get_blacklists()
-    added = [w for w in new_words if w not in existing]
-    skipped = [w for w in new_words if w in existing]
-    for word in added:
-        db.add_blacklist(word)
+    added = await db.add_blacklists(new_words)
+    skipped = [w for w in dict.fromkeys(new_words) if w not in added]
+    bump_blacklist_version(update.effective_chat.id)
     msg = ""
     if added:
         msg += f"✅ Added: {', '.join(f'<code>{w}</code>' for w in added)}"
@@ -55,6 +104,171 @@ async def add_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     LOGGERR.info(f"{update.effective_user.id} added blacklists: {added}")
     await update.message.reply_html(msg)
 
+def _is_csv(document) -> bool:
+    return (document.file_name or "").lower().endswith(".csv") or document.mime_type == "text/csv"
+
+def _is_word_file(document) -> bool:
+    name = (document.file_name or "").lower()
+    return name.endswith((".txt", ".csv")) or (document.mime_type or "").startswith("text/")
+
+def _read_blacklist_file(buffer: BytesIO, is_csv: bool):
+    """Stream words out of a text/CSV file; returns (unique words, duplicates, too long).
+
+    .txt files hold words separated by lines or whitespace, .csv files one
+    word per cell. Raises csv.Error for malformed CSV.
+    """
+    text = TextIOWrapper(buffer, encoding="utf-8-sig", errors="ignore")
+    if is_csv:
+        cells = (cell for row in csv.reader(text) for cell in row)
+    else:
+        cells = (word for line in text for word in line.split())
+    words = {}
+    duplicates = too_long = 0
+    for cell in cells:
+        word = cell.strip().lower()
+        if not word:
+            continue
+        if len(word) > MAX_WORD_LENGTH:
+            too_long += 1
+        elif word in words:
+            duplicates += 1
+        else:
+            words[word] = None
+    return list(words), duplicates, too_long
+
+async def _download_word_file(update: Update, document):
+    """Read a replied word file, or reply with the problem and return None."""
+    if not _is_word_file(document):
+        await update.message.reply_text("Only .txt or .csv files can be imported.")
+        return None
+    if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+        await update.message.reply_text(f"File too large, the limit is {MAX_IMPORT_BYTES // 1024} KB.")
+        return None
+    buffer = BytesIO()
+    await (await document.get_file()).download_to_memory(buffer)
+    buffer.seek(0)
+    try:
+        return _read_blacklist_file(buffer, _is_csv(document))
+    except csv.Error as e:
+        await update.message.reply_text(f"Couldn't read that CSV file: {e}")
+        return None
+
+# Bulk import blacklist words from a text/CSV document
+async def import_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await has_permission(update, context):
+        return
+    reply = update.message.reply_to_message
+    document = reply.document if reply else None
+    if not document:
+        await update.message.reply_text("Reply to a .txt or .csv file with /importblacklist")
+        return
+    parsed = await _download_word_file(update, document)
+    if parsed is None:
+        return
+    words, duplicates, too_long = parsed
+    if not words:
+        await update.message.reply_text("No words found in that file.")
+        return
+    db = AsyncBlacklist(update.effective_chat.id)
+    added = await db.add_blacklists(words)
+    bump_blacklist_version(update.effective_chat.id)
+    LOGGERR.info(f"{update.effective_user.id} imported {len(added)} blacklists")
+    await update.message.reply_html(
+        f"✅ Imported: <b>{len(added)}</b>\n"
+        f"⚠️ Already exists: <b>{len(words) - len(added)}</b>\n"
+        f"♻️ Duplicates in file: <b>{duplicates}</b>"
+        + (f"\n✂️ Longer than {MAX_WORD_LENGTH} characters: <b>{too_long}</b>" if too_long else "")
+    )
+
+# Export blacklist words as a text document
+async def export_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await has_permission(update, context):
+        return
+    db = AsyncBlacklist(update.effective_chat.id)
+    words = await db.get_blacklists()
+    if not words:
+        await update.message.reply_text("No blacklisted words to export.")
+        return
+    await update.message.reply_document(
+        document=BytesIO("\n".join(words).encode()),
+        filename=f"blacklist_{update.effective_chat.id}.txt",
+        caption=f"{len(words)} blacklisted words",
+    )
+
+# Owner-only: add words to a shared pack (args or a replied .txt/.csv file)
+async def add_pack(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in OWNER_ID:
+        return
+    if not context.args or not valid_pack_name(context.args[0].lower()):
+        await update.message.reply_text("Usage: /addpack <name> <word1> <word2> ... (or reply to a file)")
+        return
+    name = context.args[0].lower()
+    words = [w.lower() for w in context.args[1:]]
+    reply = update.message.reply_to_message
+    if reply and reply.document:
+        parsed = await _download_word_file(update, reply.document)
+        if parsed is None:
+            return
+        words += parsed[0]
+    added = await add_pack_words(name, words)
+    LOGGERR.info(f"{update.effective_user.id} added {len(added)} words to pack {name}")
+    await update.message.reply_html(f"✅ Added <b>{len(added)}</b> words to pack <code>{name}</code>.")
+
+# Owner-only: remove words from a shared pack
+async def rm_pack(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in OWNER_ID:
+        return
+    if len(context.args) < 2:
+        await update.message.reply_text("Usage: /rmpack <name> <word1> <word2> ...")
+        return
+    name = context.args[0].lower()
+    removed = await remove_pack_words(name, [w.lower() for w in context.args[1:]])
+    LOGGERR.info(f"{update.effective_user.id} removed {len(removed)} words from pack {name}")
+    await update.message.reply_html(f"❌ Removed <b>{len(removed)}</b> words from pack <code>{name}</code>.")
+
+# List shared packs and this chat's subscriptions
+async def view_packs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await has_permission(update, context):
+        return
+    packs = await list_packs()
+    if not packs:
+        await update.message.reply_text("No blacklist packs available.")
+        return
+    subscribed = await subscribed_packs(update.effective_chat.id)
+    lines = "\n".join(
+        f" {'✅' if name in subscribed else '▫️'} <code>{name}</code> — {count} words (v{version})"
+        for name, version, count in packs
+    )
+    await update.message.reply_html(f"Blacklist packs:\n\n{lines}")
+
+# Subscribe or unsubscribe this chat to a shared pack
+async def subscribe_pack(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await has_permission(update, context):
+        return
+    if not context.args:
+        await update.message.reply_text("Usage: /blsubscribe <pack>")
+        return
+    name = context.args[0].lower()
+    if not await pack_exists(name):
+        await update.message.reply_html(f"No pack named <code>{escape(name)}</code>.")
+        return
+    if await subscribe(update.effective_chat.id, name):
+        await update.message.reply_html(f"✅ Subscribed to <code>{name}</code>.")
+    else:
+        await update.message.reply_html(f"⚠️ Already subscribed to <code>{name}</code>.")
+
+async def unsubscribe_pack(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await has_permission(update, context):
+        return
+    if not context.args:
+        await update.message.reply_text("Usage: /blunsubscribe <pack>")
+        return
+    name = context.args[0].lower()
+    if await unsubscribe(update.effective_chat.id, name):
+        await update.message.reply_html(f"❌ Unsubscribed from <code>{escape(name)}</code>.")
+    else:
+        await update.message.reply_html(f"⚠️ Not subscribed to <code>{escape(name)}</code>.")
+
 # Remove blacklist words
 async def rm_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await has_permission(update, context):
@@ -62,13 +276,14 @@ async def rm_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(context.args) < 1:
         await update.message.reply_text("Usage: /rmblacklist <word1> <word2> ...")
         return
-    db = Blacklist(update.effective_chat.id)
+    db = AsyncBlacklist(update.effective_chat.id)
     remove_words = [w.lower() for w in context.args]
-    existing = db.get_blacklists()
+    existing = await db.get_blacklists()
     removed = [w for w in remove_words if w in existing]
     not_found = [w for w in remove_words if w not in existing]
     for word in removed:
-        db.remove_blacklist(word)
+        await db.remove_blacklist(word)
+    bump_blacklist_version(update.effective_chat.id)
     msg = ""
     if removed:
         msg += f"❌ Removed: {', '.join(f'<code>{w}</code>' for w in removed)}"
@@ -81,7 +296,7 @@ async def rm_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def set_blacklist_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await has_permission(update, context):
         return
-    db = Blacklist(update.effective_chat.id)
+    db = AsyncBlacklist(update.effective_chat.id)
     valid = ("ban", "kick", "mute", "warn", "none")
     if context.args:
         action = context.args[0].lower()
@@ -90,11 +305,12 @@ async def set_blacklist_action(update: Update, context: ContextTypes.DEFAULT_TYP
                 f"Invalid action!\nChoose from: {', '.join(f'<code>{v}</code>' for v in valid)}"
             )
             return
-        db.set_action(action)
+        await db.set_action(action)
+        bump_blacklist_version(update.effective_chat.id)
         LOGGERR.info(f"{update.effective_user.id} set blacklist action to {action}")
         await update.message.reply_html(f"✅ Action set to: <b>{action}</b>")
     else:
-        current = db.get_action()
+        current = await db.get_action()
         await update.message.reply_html(
             f"The current blacklist action is: <b>{current}</b>\nAll blacklist actions auto-delete the message."
         )
@@ -103,21 +319,22 @@ async def set_blacklist_action(update: Update, context: ContextTypes.DEFAULT_TYP
 async def blacklist_reason(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await has_permission(update, context):
         return
-    db = Blacklist(update.effective_chat.id)
+    db = AsyncBlacklist(update.effective_chat.id)
     if not context.args:
-        reason = db.get_reason()
+        reason = await db.get_reason()
         await update.message.reply_html(f"Current reason: <code>{reason}</code>")
         return
     reason = " ".join(context.args)
-    db.set_reason(reason)
+    await db.set_reason(reason)
+    bump_blacklist_version(update.effective_chat.id)
     await update.message.reply_html(f"Updated blacklist reason:\n<code>{reason}</code>")
 
 # Owner-only: Confirm remove all blacklists
 async def confirm_clear_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in OWNER_ID:
         return
-    db = Blacklist(update.effective_chat.id)
-    if not db.get_blacklists():
+    db = AsyncBlacklist(update.effective_chat.id)
+    if not await db.get_blacklists():
         await update.message.reply_text("No blacklisted words to remove.")
         return
     keyboard = [
@@ -136,12 +353,12 @@ async def callback_rm_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user = query.from_user
     chat = query.message.chat
-    chat_member = await context.bot.get_chat_member(chat.id, user.id)
-    if chat_member.status != ChatMember.OWNER:
+    if not await is_owner(chat.id, user.id):
         await query.answer("Only group owner can do this!", show_alert=True)
         return
-    db = Blacklist(chat.id)
-    db.rm_all_blacklist()
+    db = AsyncBlacklist(chat.id)
+    await db.rm_all_blacklist()
+    bump_blacklist_version(chat.id)
     LOGGERR.info(f"{user.id} cleared all blacklists")
     await query.message.delete()
     await query.answer("✅ All blacklists removed!", show_alert=True)
@@ -150,34 +367,50 @@ async def callback_rm_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def filter_blacklisted_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.text or update.effective_user is None:
         return
-    db = Blacklist(update.effective_chat.id)
-    words = db.get_blacklists()
-    action = db.get_action()
-    if not words:
+    chat_id = update.effective_chat.id
+    _, matcher, action, reason = await get_blacklist_matcher(chat_id)
+    # The chat's own small list first, then the shared pack automatons
+    matchers = [matcher] if matcher is not None else []
+    matchers += await chat_pack_matchers(chat_id)
+    if not matchers:
         return
-    text = update.message.text.lower()
-    pattern = r'\b(' + '|'.join(re.escape(word) for word in words) + r')\b'
-    if re.search(pattern, text):
-        await update.message.delete()
+    text = fold_text(update.message.text)
+    if any(m.search(text) for m in matchers):
         user_id = update.effective_user.id
+        # Repeat offences within the ledger TTL only get their message deleted
+        if not enforcement_ledger.first(chat_id, user_id, action):
+            blacklist_deleter.add(chat_id, [update.message.message_id])
+            return
+        # Queued, not awaited: a paused lane must not hold up this handler
+        gateway.submit(MODERATION, chat_id, update.message.delete)
         if action == "ban":
-            await context.bot.ban_chat_member(update.effective_chat.id, user_id)
+            gateway.submit(MODERATION, chat_id, context.bot.ban_chat_member, chat_id, user_id)
         elif action == "kick":
-            await context.bot.ban_chat_member(update.effective_chat.id, user_id)
-            await context.bot.unban_chat_member(update.effective_chat.id, user_id)
+            gateway.submit(MODERATION, chat_id, context.bot.ban_chat_member, chat_id, user_id)
+            gateway.submit(MODERATION, chat_id, context.bot.unban_chat_member, chat_id, user_id)
         elif action == "mute":
-            await context.bot.restrict_chat_member(update.effective_chat.id, user_id, permissions={"can_send_messages": False})
+            gateway.submit(MODERATION, chat_id, context.bot.restrict_chat_member, chat_id, user_id, permissions={"can_send_messages": False})
         elif action == "warn":
-            reason = db.get_reason()
-            await update.effective_chat.send_message(
+            gateway.submit(
+                MODERATION,
+                chat_id,
+                update.effective_chat.send_message,
                 f"⚠️ Warning!\nBlacklisted word used.\nReason: {reason}",
-                reply_to_message_id=update.message.message_id
+                reply_to_message_id=update.message.message_id,
+                allow_sending_without_reply=True,
             )
 
 # Register handlers
 app_instance.add_handler(CommandHandler("blacklist", view_blacklist))
 app_instance.add_handler(CommandHandler("addblacklist", add_blacklist))
 app_instance.add_handler(CommandHandler(["rmblacklist", "unblacklist"], rm_blacklist))
+app_instance.add_handler(CommandHandler("importblacklist", import_blacklist))
+app_instance.add_handler(CommandHandler("exportblacklist", export_blacklist))
+app_instance.add_handler(CommandHandler("addpack", add_pack))
+app_instance.add_handler(CommandHandler("rmpack", rm_pack))
+app_instance.add_handler(CommandHandler(["blpacks", "blacklistpacks"], view_packs))
+app_instance.add_handler(CommandHandler("blsubscribe", subscribe_pack))
+app_instance.add_handler(CommandHandler("blunsubscribe", unsubscribe_pack))
 app_instance.add_handler(CommandHandler(["blaction", "blacklistaction", "blacklistmode"], set_blacklist_action))
 app_instance.add_handler(CommandHandler("blreason", blacklist_reason))
 app_instance.add_handler(CommandHandler("rmallblacklist", confirm_clear_all))
@@ -192,6 +425,11 @@ __HELP__ = """
 » `/blacklist` - ꜱʜᴏᴡ ᴀʟʟ ʙʟᴀᴄᴋʟɪꜱᴛᴇᴅ ᴡᴏʀᴅꜱ ɪɴ ᴛʜᴇ ɢʀᴏᴜᴘ.
 » `/addblacklist <word1> <word2>` - ᴀᴅᴅ ᴡᴏʀᴅꜱ ᴛᴏ ʙʟᴀᴄᴋʟɪꜱᴛ.
 » `/rmblacklist <word1> <word2>` - ʀᴇᴍᴏᴠᴇ ᴡᴏʀᴅꜱ ꜰʀᴏᴍ ʙʟᴀᴄᴋʟɪꜱᴛ.
+» `/importblacklist` - ʀᴇᴘʟʏ ᴛᴏ ᴀ .ᴛxᴛ/.ᴄꜱᴠ ꜰɪʟᴇ ᴛᴏ ᴀᴅᴅ ᴀʟʟ ɪᴛꜱ ᴡᴏʀᴅꜱ.
+» `/exportblacklist` - ɢᴇᴛ ᴛʜᴇ ʙʟᴀᴄᴋʟɪꜱᴛ ᴀꜱ ᴀ ᴛᴇxᴛ ꜰɪʟᴇ.
+» `/blpacks` - ʟɪꜱᴛ ꜱʜᴀʀᴇᴅ ʙʟᴀᴄᴋʟɪꜱᴛ ᴘᴀᴄᴋꜱ.
+» `/blsubscribe <pack>` - ᴜꜱᴇ ᴀ ꜱʜᴀʀᴇᴅ ᴘᴀᴄᴋ ɪɴ ᴛʜɪꜱ ᴄʜᴀᴛ.
+» `/blunsubscribe <pack>` - ꜱᴛᴏᴘ ᴜꜱɪɴɢ ᴀ ꜱʜᴀʀᴇᴅ ᴘᴀᴄᴋ.
 » `/blaction <action>` - ꜱᴇᴛ ᴀᴄᴛɪᴏɴ ᴏɴ ʙʟᴀᴄᴋʟɪꜱᴛᴇᴅ ᴡᴏʀᴅ:
    → `ban`, `kick`, `mute`, `warn`, `none`
 » `/blreason <reason>` - ꜱᴇᴛ ᴄᴜꜱᴛᴏᴍ ʀᴇᴀꜱᴏɴ ꜰᴏʀ ᴡᴀʀɴɪɴɢ.
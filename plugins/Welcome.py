@@ -1,7 +1,5 @@
-from secrets import choice
-from html import escape
+import asyncio
 from traceback import format_exc
-from datetime import datetime
 
 from pyrogram import enums, filters
 from pyrogram.enums import ChatMemberStatus as CMS
@@ -19,10 +17,16 @@ from Bad.database.supportsdb import get_support_staff
 from Bad.database.cmd_sendersdb import send_cmd
 from Bad.database.kbhelpersdb import ikb
 from Bad.database.msg_typesdb import Types, get_wlcm_type
-from Bad.database.parserdb import escape_markdown, mention_html
-from Bad.database.stringdb import (build_keyboard, escape_invalid_curly_brackets,
-                                 parse_button)
+from Bad.database.parserdb import escape_markdown
+from Bad.database.stringdb import build_keyboard, parse_button
 import config
+from utils.batcher import ChatBatcher
+from utils.gateway import GREETING, MODERATION, gateway
+from utils.greeting_plan import greeting_plan, render_greeting
+from utils.greetings import (get_greetings, invalidate_greetings,
+                             set_cleangoodbye_id, set_cleanwelcome_id)
+from utils.member_count import member_count
+from utils.raid import raid_monitor
 
 # Initialize
 gdb = GBan()
@@ -31,49 +35,13 @@ DEV_USERS = get_support_staff("dev")
 
 ChatType = enums.ChatType
 
-async def escape_mentions_using_curly_brackets_wl(
-    m: ChatMemberUpdated,
-    n: bool,
-    text: str,
-    parse_words: list,
-    total_members: int,
-) -> str:
-    teks = await escape_invalid_curly_brackets(text, parse_words)
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if n:
-        user = m.new_chat_member.user if m.new_chat_member else m.from_user
-    else:
-        user = m.old_chat_member.user if m.old_chat_member else m.from_user
-    if teks:
-        teks = teks.format(
-            first=escape(user.first_name),
-            last=escape(user.last_name or user.first_name),
-            fullname=" ".join(
-                [
-                    escape(user.first_name),
-                    escape(user.last_name),
-                ]
-                if user.last_name
-                else [escape(user.first_name)],
-            ),
-            username=(
-                "@" + user.username
-                if user.username
-                else (await mention_html(escape(user.first_name), user.id))
-            ),
-            mention=await mention_html(escape(user.first_name), user.id),
-            chatname=escape(m.chat.title)
-            if m.chat.type != ChatType.PRIVATE
-            else escape(user.first_name),
-            id=user.id,
-            time=current_time,  # Add the current time here
-            totalmember=total_members,  # Add the total member count here
-        )
-    else:
-        teks = ""
-
-    return teks
+# A chat's joins are greeted together once WELCOME_BATCH_WINDOW seconds
+# pass without another join, or as soon as WELCOME_BATCH_MAX are queued
+WELCOME_BATCH_WINDOW = getattr(config, "WELCOME_BATCH_WINDOW", 2)
+WELCOME_BATCH_MAX = getattr(config, "WELCOME_BATCH_MAX", 20)
 
+DEFAULT_WELCOME = "ʜᴇʏ {first}, ᴡᴇʟᴄᴏᴍᴇ ᴛᴏ {chatname} 🥀"
+DEFAULT_GOODBYE = "sᴀᴅ ᴛᴏ sᴇᴇ ʏᴏᴜ ʟᴇᴀᴠɪɴɢ {first}. ᴛᴀᴋᴇ ᴄᴀʀᴇ! 🌸"
 
 @app.on_message(
     filters.command(["cleanwelcome"]))
@@ -86,10 +54,12 @@ async def cleanwlcm(_, m: Message):
     if len(args) >= 2:
         if args[1].lower() == "on":
             db.set_current_cleanwelcome_settings(True)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ᴛᴜʀɴᴇᴅ ᴏɴ!")
             return
         if args[1].lower() == "off":
             db.set_current_cleanwelcome_settings(False)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ᴛᴜʀɴᴇᴅ ᴏꜰꜰ!")
             return
         await m.reply_text("ᴡʜᴀᴛ ᴀʀᴇ ʏᴏᴜ ᴛʀʏɪɴɢ ᴛᴏ ᴅᴏ ??")
@@ -108,10 +78,12 @@ async def cleangdbye(_, m: Message):
     if len(args) >= 2:
         if args[1].lower() == "on":
             db.set_current_cleangoodbye_settings(True)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ᴛᴜʀɴᴇᴅ ᴏɴ!")
             return
         if args[1].lower() == "off":
             db.set_current_cleangoodbye_settings(False)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ᴛᴜʀɴᴇᴅ ᴏꜰꜰ!")
             return
         await m.reply_text("ᴡʜᴀᴛ ᴀʀᴇ ʏᴏᴜ ᴛʀʏɪɴɢ ᴛᴏ ᴅᴏ ??")
@@ -130,10 +102,12 @@ async def cleanservice(_, m: Message):
     if len(args) >= 2:
         if args[1].lower() == "on":
             db.set_current_cleanservice_settings(True)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ᴛᴜʀɴᴇᴅ ᴏɴ!")
             return
         if args[1].lower() == "off":
             db.set_current_cleanservice_settings(False)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ᴛᴜʀɴᴇᴅ ᴏꜰꜰ!")
             return
         await m.reply_text("ᴡʜᴀᴛ ᴀʀᴇ ʏᴏᴜ ᴛʀʏɪɴɢ ᴛᴏ ᴅᴏ ??")
@@ -177,6 +151,7 @@ async def save_wlcm(_, m: Message):
         return
 
     db.set_welcome_text(text,msgtype,file)
+    invalidate_greetings(m.chat.id)
     await m.reply_text("ꜱᴀᴠᴇᴅ ᴡᴇʟᴄᴏᴍᴇ 🎉")
     return
 
@@ -216,6 +191,7 @@ async def save_gdbye(_, m: Message):
         return
 
     db.set_goodbye_text(text,msgtype,file)
+    invalidate_greetings(m.chat.id)
     await m.reply_text("ꜱᴀᴠᴇᴅ ɢᴏᴏᴅʙʏᴇ 🎉")
     return
 
@@ -227,8 +203,9 @@ async def resetgb(_, m: Message):
     db = Greetings(m.chat.id)
     if m and not m.from_user:
         return
-    text = "sᴀᴅ ᴛᴏ sᴇᴇ ʏᴏᴜ ʟᴇᴀᴠɪɴɢ {first}.\ ᴛᴀᴋᴇ ᴄᴀʀᴇ! 🌸"
+    text = DEFAULT_GOODBYE
     db.set_goodbye_text(text,None)
+    invalidate_greetings(m.chat.id)
     await m.reply_text("Ok Done!")
     return
 
@@ -241,14 +218,14 @@ async def resetwlcm(_, m: Message):
         return
     text = "ʜᴇʏ {first}, ᴡᴇʟᴄᴏᴍᴇ ᴛᴏ {chatname} 🥀!"
     db.set_welcome_text(text,None)
+    invalidate_greetings(m.chat.id)
     await m.reply_text("Done!")
     return
 
 
 @app.on_message(filters.service & filters.group, group=59)
 async def cleannnnn(_, m: Message):
-    db = Greetings(m.chat.id)
-    clean = db.get_current_cleanservice_settings()
+    clean = (await get_greetings(m.chat.id)).cleanservice
     try:
         if clean:
             await m.delete()
@@ -256,6 +233,60 @@ async def cleannnnn(_, m: Message):
         pass
 
 
+async def send_welcome(chat_id: int, members):
+    """Greet every member queued for the chat in one message."""
+    greet = await get_greetings(chat_id)
+    status = greet.welcome
+    oo = greet.welcome_text
+    UwU = greet.welcome_media
+    mtype = greet.welcome_mtype
+
+    if status:
+        plan = await greeting_plan(chat_id, "welcome", oo, DEFAULT_WELCOME)
+        teks, button = await render_greeting(
+            plan, members, True, lambda: member_count(chat_id)
+        )
+        ifff = greet.cleanwelcome_id
+        gg = greet.cleanwelcome
+        if ifff and gg:
+            gateway.submit(GREETING, chat_id, app.delete_messages, chat_id, int(ifff))
+        try:
+            if not UwU:
+                jj = await gateway.queue(
+                    GREETING,
+                    chat_id,
+                    app.send_message,
+                    chat_id,
+                    text=teks,
+                    reply_markup=button,
+                    disable_web_page_preview=True,
+                )
+            elif UwU:
+                jj = await gateway.queue(
+                    GREETING,
+                    chat_id,
+                    await send_cmd(app,mtype),
+                    chat_id,
+                    UwU,
+                    caption=teks,
+                    reply_markup=button,
+                )
+
+            if jj:
+                await set_cleanwelcome_id(chat_id, int(jj.id))
+        except RPCError as e:
+            LOGGER.error(e)
+            LOGGER.error(format_exc(e))
+            return
+    else:
+        return
+
+
+welcome_batcher = ChatBatcher(
+    send_welcome, interval=WELCOME_BATCH_WINDOW, batch_size=WELCOME_BATCH_MAX, debounce=True
+)
+
+
 @app.on_chat_member_updated(filters.group, group=69)
 async def member_has_joined(c: app, member: ChatMemberUpdated):
 
@@ -269,22 +300,28 @@ async def member_has_joined(c: app, member: ChatMemberUpdated):
         return
 
     user = member.new_chat_member.user if member.new_chat_member else member.from_user
+    raid = raid_monitor.record_join(member.chat.id)
 
-    db = Greetings(member.chat.id)
     banned_users = gdb.check_gban(user.id)
     try:
         if user.id == config.BOT_ID:
             return
         if user.id in DEV_USERS:
-            await c.send_animation(
+            gateway.submit(
+                GREETING,
+                member.chat.id,
+                c.send_animation,
                 chat_id=member.chat.id,
                 animation="./Bad/welcome/william (1).gif",
                 caption="ᴍʏ ᴏᴡɴᴇʀ ɪs ʜᴇʀᴇ 🌸🙈❤️",
             )
             return
         if banned_users:
-            await member.chat.ban_member(user.id)
-            await c.send_message(
+            gateway.submit(MODERATION, member.chat.id, member.chat.ban_member, user.id)
+            gateway.submit(
+                MODERATION,
+                member.chat.id,
+                c.send_message,
                 member.chat.id,
                 f"{user.mention} ᴡᴀꜱ ɢʟᴏʙᴀʟʟʏ ʙᴀɴɴᴇᴅ ꜱᴏ ɪ ʙᴀɴɴᴇᴅ!",
             )
@@ -293,67 +330,13 @@ async def member_has_joined(c: app, member: ChatMemberUpdated):
             return  # ignore bots
     except ChatAdminRequired:
         return
-    status = db.get_welcome_status()
-    oo = db.get_welcome_text()
-    UwU = db.get_welcome_media()
-    mtype = db.get_welcome_msgtype()
-    parse_words = [
-        "first",
-        "last",
-        "fullname",
-        "username",
-        "mention",
-        "id",
-        "chatname",
-        "time",
-        "totalmember",
-    ]
-
-    total_members = await c.get_chat_members_count(member.chat.id)
-    hmm = await escape_mentions_using_curly_brackets_wl(member, True, oo, parse_words, total_members)
-    if status:
-        tek, button = await parse_button(hmm)
-        button = await build_keyboard(button)
-        button = ikb(button) if button else None
-
-        if "%%%" in tek:
-            filter_reply = tek.split("%%%")
-            teks = choice(filter_reply)
-        else:
-            teks = tek
-        ifff = db.get_current_cleanwelcome_id()
-        gg = db.get_current_cleanwelcome_settings()
-        if ifff and gg:
-            try:
-                await c.delete_messages(member.chat.id, int(ifff))
-            except RPCError:
-                pass
-        if not teks:
-            teks = "ʜᴇʏ {first}, ᴡᴇʟᴄᴏᴍᴇ ᴛᴏ {chatname} 🥀"
-        try:
-            if not UwU:
-                jj = await c.send_message(
-                    member.chat.id,
-                    text=teks,
-                    reply_markup=button,
-                    disable_web_page_preview=True,
-                )
-            elif UwU:
-                jj = await (await send_cmd(c,mtype))(
-                    member.chat.id,
-                    UwU,
-                    caption=teks,
-                    reply_markup=button,
-                )
-
-            if jj:
-                db.set_cleanwlcm_id(int(jj.id))
-        except RPCError as e:
-            LOGGER.error(e)
-            LOGGER.error(format_exc(e))
-            return
-    else:
+    if raid:
+        return  # no greetings during a join raid
+    if not (await get_greetings(member.chat.id)).welcome:
         return
+    # Each join restarts this chat's window; a full batch goes out at once
+    if welcome_batcher.add(member.chat.id, [member]) >= WELCOME_BATCH_MAX:
+        await welcome_batcher.flush(member.chat.id)
 
 
 @app.on_chat_member_updated(filters.group, group=99)
@@ -367,62 +350,48 @@ async def member_has_left(c: app, member: ChatMemberUpdated):
         pass
     else:
         return
-    db = Greetings(member.chat.id)
-    status = db.get_goodbye_status()
-    oo = db.get_goodbye_text()
-    UwU = db.get_goodbye_media()
-    mtype = db.get_goodbye_msgtype()
-    parse_words = [
-        "first",
-        "last",
-        "fullname",
-        "id",
-        "username",
-        "mention",
-        "chatname",
-        "time",
-        "totalmember",
-    ]
+    greet = await get_greetings(member.chat.id)
+    status = greet.goodbye
+    oo = greet.goodbye_text
+    UwU = greet.goodbye_media
+    mtype = greet.goodbye_mtype
 
     user = member.old_chat_member.user if member.old_chat_member else member.from_user
 
-    total_members = await c.get_chat_members_count(member.chat.id)
-    hmm = await escape_mentions_using_curly_brackets_wl(member, False, oo, parse_words, total_members)
     if status:
-        tek, button = await parse_button(hmm)
-        button = await build_keyboard(button)
-        button = ikb(button) if button else None
-
-        if "%%%" in tek:
-            filter_reply = tek.split("%%%")
-            teks = choice(filter_reply)
-        else:
-            teks = tek
-        ifff = db.get_current_cleangoodbye_id()
-        iii = db.get_current_cleangoodbye_settings()
+        plan = await greeting_plan(member.chat.id, "goodbye", oo, DEFAULT_GOODBYE)
+        teks, button = await render_greeting(
+            plan, [member], False, lambda: member_count(member.chat.id)
+        )
+        ifff = greet.cleangoodbye_id
+        iii = greet.cleangoodbye
         if ifff and iii:
-            try:
-                await c.delete_messages(member.chat.id, int(ifff))
-            except RPCError:
-                pass
+            gateway.submit(GREETING, member.chat.id, c.delete_messages, member.chat.id, int(ifff))
         if user.id in DEV_USERS:
-            await c.send_message(
+            gateway.submit(
+                GREETING,
+                member.chat.id,
+                c.send_message,
                 member.chat.id,
                 "ᴡɪʟʟ ᴍɪꜱꜱ ʏᴏᴜ ᴍᴀꜱᴛᴇʀ 🙁",
             )
             return
-        if not teks:
-            teks = "sᴀᴅ ᴛᴏ sᴇᴇ ʏᴏᴜ ʟᴇᴀᴠɪɴɢ {first}.\ ᴛᴀᴋᴇ ᴄᴀʀᴇ! 🌸"
         try:
             if not UwU:
-                ooo = await c.send_message(
+                ooo = await gateway.call(
+                    GREETING,
+                    member.chat.id,
+                    c.send_message,
                     member.chat.id,
                     text=teks,
                     reply_markup=button,
                     disable_web_page_preview=True,
                 )
             elif UwU:
-                ooo = await (await send_cmd(c,mtype))(
+                ooo = await gateway.call(
+                    GREETING,
+                    member.chat.id,
+                    await send_cmd(c,mtype),
                     member.chat.id,
                     UwU,
                     caption=teks,
@@ -430,8 +399,10 @@ async def member_has_left(c: app, member: ChatMemberUpdated):
                 )
 
             if ooo:
-                db.set_cleangoodbye_id(int(ooo.id))
+                await set_cleangoodbye_id(member.chat.id, int(ooo.id))
             return
+        except asyncio.TimeoutError:
+            return  # still queued; only the clean-goodbye id is lost
         except RPCError as e:
             LOGGER.error(e)
             LOGGER.error(format_exc(e))
@@ -468,10 +439,12 @@ async def welcome(c: app, m: Message):
             return
         if args[1].lower() == "on":
             db.set_current_welcome_settings(True)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ɪ ᴡɪʟʟ ɢʀᴇᴇᴛ ɴᴇᴡʟʏ ᴊᴏɪɴᴇᴅ ᴍᴇᴍʙᴇʀ ꜰʀᴏᴍ ɴᴏᴡ ᴏɴ 👻")
             return
         if args[1].lower() == "off":
             db.set_current_welcome_settings(False)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ɪ ᴡɪʟʟ ꜱᴛᴀʏ Qᴜɪᴇᴛ ᴡʜᴇɴ ꜱᴏᴍᴇᴏɴᴇ ᴊᴏɪɴꜱ🥺")
             return
         await m.reply_text("ᴡʜᴀᴛ ᴀʀᴇ ʏᴏᴜ ᴛʀʏɪɴɢ ᴛᴏ ᴅᴏ ??")
@@ -531,10 +504,12 @@ async def goodbye(c: app, m: Message):
             return
         if args[1].lower() == "on":
             db.set_current_goodbye_settings(True)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ɪ ᴅᴏɴ'ᴛ ᴡᴀɴᴛ ʙᴜᴛ ɪ ᴡɪʟʟ ꜱᴀʏ ɢᴏᴏᴅʙʏᴇ ᴛᴏ ᴛʜᴇ ꜰᴜɢɪᴛɪᴠᴇꜱ")
             return
         if args[1].lower() == "off":
             db.set_current_goodbye_settings(False)
+            invalidate_greetings(m.chat.id)
             await m.reply_text("ɪ ᴡɪʟʟ ꜱᴛᴀʏ Qᴜɪᴇᴛ ꜰᴏʀ ꜰᴜɢɪᴛɪᴠᴇꜱ")
             return
         await m.reply_text("ᴡʜᴀᴛ ᴀʀᴇ ʏᴏᴜ ᴛʀʏɪɴɢ ᴛᴏ ᴅᴏ ??")
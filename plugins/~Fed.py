@@ -13,13 +13,56 @@ from pyrogram.enums import ChatMemberStatus, ChatType, ParseMode
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from Bad.database.fedfundb import extract_user, extract_user_and_reason
-from pyrogram.errors import FloodWait, PeerIdInvalid
+from pyrogram.errors import PeerIdInvalid
 from Bad.database.errordb import capture_err
+from utils.callbacks import callback_router
+from utils.gateway import BROADCAST, MODERATION, gateway
+from utils.singleflight import get_chat_member, get_users
 
 BOT_ID = "7436017266"
 SUPPORT_CHAT = "@PBX_CHAT"
 COMMAND_HANDLER = ("/")
 
+# Fed-wide sweeps outlive the command handler; keep a reference until done
+_sweeps = set()
+
+
+def _in_background(coro):
+    task = asyncio.create_task(coro)
+    _sweeps.add(task)
+    task.add_done_callback(_sweeps.discard)
+
+
+async def _sweep_chat(served_chat, user_id, status, action, notice=None):
+    """Apply `action` in one fed chat if the user's status there is `status`."""
+    # Paced with the writes; a FloodWait pauses the lane and retries
+    chat_member = await gateway.queue(
+        MODERATION, served_chat, get_chat_member, served_chat, user_id
+    )
+    if chat_member.status != status:
+        return False
+    await gateway.queue(MODERATION, served_chat, action, served_chat, user_id)
+    if notice:
+        gateway.submit(MODERATION, served_chat, app.send_message, served_chat, notice)
+    return True
+
+
+async def _sweep_fed(served_chats, user_id, status, action, notice, origin):
+    results = await asyncio.gather(
+        *(
+            _sweep_chat(
+                served_chat,
+                user_id,
+                status,
+                action,
+                notice if served_chat != origin else None,
+            )
+            for served_chat in served_chats
+        ),
+        return_exceptions=True,
+    )
+    return sum(1 for result in results if result is True)
+
 
 @app.on_message(filters.command("newfed", COMMAND_HANDLER))
 @capture_err
@@ -427,7 +470,7 @@ async def get_all_fadmins_mentions(client, message):
     user_mentions = []
     for user_id in fadmin_ids:
         try:
-            user = await app.get_users(int(user_id))
+            user = await get_users(int(user_id))
             user_mentions.append(f"● {user.mention}[`{user.id}`]")
         except Exception:
             user_mentions.append(f"● `Admin🥷`[`{user_id}`]")
@@ -460,7 +503,7 @@ async def fpromote(client, message):
             return await message.reply_text("Failed to extract user from the message.")
         check_user = await check_banned_user(fed_id, user_id)
         if check_user:
-            user = await app.get_users(user_id)
+            user = await get_users(user_id)
             reason = check_user["reason"]
             date = check_user["date"]
             return await message.reply_text(
@@ -561,7 +604,7 @@ async def fban_user(client, message):
         )
     user_id, reason = await extract_user_and_reason(message)
     try:
-        user = await app.get_users(user_id)
+        user = await get_users(user_id)
     except PeerIdInvalid:
         return await message.reply_msg("Sorry, i never meet this user. So i cannot fban.")
     if not user_id:
@@ -584,23 +627,16 @@ async def fban_user(client, message):
         + f" **This Action Should Take About {len(served_chats)} Seconds.**"
     )
     await add_fban_user(fed_id, user_id, reason)
-    number_of_chats = 0
-    for served_chat in served_chats:
-        try:
-            chat_member = await app.get_chat_member(served_chat, user.id)
-            if chat_member.status == ChatMemberStatus.MEMBER:
-                await app.ban_chat_member(served_chat, user.id)
-                if served_chat != chat.id:
-                    if not message.text.startswith("/s"):
-                        await app.send_message(
-                            served_chat, f"**Fed Banned {user.mention} !**"
-                        )
-                number_of_chats += 1
-            await asyncio.sleep(1)
-        except FloodWait as e:
-            await asyncio.sleep(int(e.value))
-        except Exception:
-            pass
+    notice = None if message.text.startswith("/s") else f"**Fed Banned {user.mention} !**"
+    _in_background(_finish_fban(message, info, user, reason, served_chats, notice, m))
+
+
+async def _finish_fban(message, info, user, reason, served_chats, notice, m):
+    from_user = message.from_user
+    user_id = user.id
+    number_of_chats = await _sweep_fed(
+        served_chats, user_id, ChatMemberStatus.MEMBER, app.ban_chat_member, notice, message.chat.id
+    )
     try:
         await app.send_message(
             user.id,
@@ -657,7 +693,7 @@ async def funban_user(client, message):
             "**You needed to specify a user or reply to their message!**"
         )
     user_id, reason = await extract_user_and_reason(message)
-    user = await app.get_users(user_id)
+    user = await get_users(user_id)
     if not user_id:
         return await message.reply_text("I can't find that user.")
     if user_id in all_admins or user_id in SUDO:
@@ -676,23 +712,16 @@ async def funban_user(client, message):
         + f" **This Action Should Take About {len(served_chats)} Seconds.**"
     )
     await remove_fban_user(fed_id, user_id)
-    number_of_chats = 0
-    for served_chat in served_chats:
-        try:
-            chat_member = await app.get_chat_member(served_chat, user.id)
-            if chat_member.status == ChatMemberStatus.BANNED:
-                await app.unban_chat_member(served_chat, user.id)
-                if served_chat != chat.id:
-                    if not message.text.startswith("/s"):
-                        await app.send_message(
-                            served_chat, f"**Fed UnBanned {user.mention} !**"
-                        )
-                number_of_chats += 1
-            await asyncio.sleep(1)
-        except FloodWait as e:
-            await asyncio.sleep(int(e.value))
-        except Exception:
-            pass
+    notice = None if message.text.startswith("/s") else f"**Fed UnBanned {user.mention} !**"
+    _in_background(_finish_unfban(message, info, user, reason, served_chats, notice, m))
+
+
+async def _finish_unfban(message, info, user, reason, served_chats, notice, m):
+    from_user = message.from_user
+    user_id = user.id
+    number_of_chats = await _sweep_fed(
+        served_chats, user_id, ChatMemberStatus.BANNED, app.unban_chat_member, notice, message.chat.id
+    )
     try:
         await app.send_message(
             user.id,
@@ -733,9 +762,12 @@ async def check_banned(client, message: Message):
         if fed_id:
             is_banned = await check_banned_user(fed_id, user.id)
             if is_banned:
-                await app.ban_chat_member(chat.id, user.id)
-                await message.delete()
-                await app.send_message(
+                gateway.submit(MODERATION, chat.id, app.ban_chat_member, chat.id, user.id)
+                gateway.submit(MODERATION, chat.id, message.delete)
+                gateway.submit(
+                    MODERATION,
+                    chat.id,
+                    app.send_message,
                     chat.id,
                     f"User {user.mention} was automatically re-banned as they are still in the federation ban list.",
                 )
@@ -765,7 +797,7 @@ async def fedstat(client, message):
     else:
         check_user = await check_banned_user(fed_id, user_id)
         if check_user:
-            user = await app.get_users(user_id)
+            user = await get_users(user_id)
             reason = check_user["reason"]
             date = check_user["date"]
             return await message.reply_text(
@@ -801,8 +833,6 @@ async def fbroadcast_message(client, message):
         return await message.reply_text(
             "**You need to reply to a text message to Broadcasted it.**"
         )
-    sleep_time = 0.1
-
     if reply_message.text:
         text = reply_message.text.markdown
     else:
@@ -811,28 +841,33 @@ async def fbroadcast_message(client, message):
     reply_markup = None
     if reply_message.reply_markup:
         reply_markup = InlineKeyboardMarkup(reply_message.reply_markup.inline_keyboard)
-    sent = 0
     chats, _ = await chat_id_and_names_in_fed(fed_id)
     m = await message.reply_text(
-        f"Broadcast in progress, will take {len(chats) * sleep_time} seconds."
+        f"Broadcast in progress to {len(chats)} chats."
     )
-    for i in chats:
-        try:
-            await app.send_message(
+    _in_background(_finish_fbroadcast(m, chats, text, reply_markup))
+
+
+async def _finish_fbroadcast(m, chats, text, reply_markup):
+    results = await asyncio.gather(
+        *(
+            gateway.queue(
+                BROADCAST,
+                i,
+                app.send_message,
                 i,
                 text=text,
                 reply_markup=reply_markup,
             )
-            sent += 1
-            await asyncio.sleep(sleep_time)
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-        except Exception:
-            pass
+            for i in chats
+        ),
+        return_exceptions=True,
+    )
+    sent = sum(1 for result in results if not isinstance(result, Exception))
     await m.edit(f"**Broadcasted Message In {sent} Chats.**")
 
 
-@app.on_callback_query(filters.regex("rmfed_(.*)"))
+@callback_router.route("rmfed_")
 async def del_fed_button(client, cb):
     query = cb.data
     userid = cb.message.chat.id
@@ -851,7 +886,7 @@ async def del_fed_button(client, cb):
             )
 
 
-@app.on_callback_query(filters.regex("trfed_(.*)"))
+@callback_router.route("trfed_")
 async def fedtransfer_button(client, cb):
     query = cb.data
     userid = cb.message.chat.id
@@ -870,7 +905,7 @@ async def fedtransfer_button(client, cb):
         )
 
 
-@app.on_callback_query(filters.regex("fed_(.*)"))
+@callback_router.route("fed_")
 async def fed_owner_help(client, cb):
     query = cb.data
     userid = cb.message.chat.id
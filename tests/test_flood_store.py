@@ -0,0 +1,156 @@
+import pytest
+
+from utils.flood_store import (
+    FloodRecord,
+    FloodStore,
+    check_flood,
+    fixed_window,
+    sliding_window,
+    token_bucket,
+)
+
+
+def send(record, engine, times, limit, window):
+    return [check_flood(record, engine, now, limit, window) for now in times]
+
+
+def test_fixed_window_flags_message_over_limit():
+    record = FloodRecord(0)
+    assert send(record, fixed_window, [0, 1, 2, 3], 3, 10) == [False, False, False, True]
+
+
+def test_fixed_window_resets_exactly_at_boundary():
+    record = FloodRecord(0)
+    send(record, fixed_window, [0, 1, 2], 3, 10)
+    assert check_flood(record, fixed_window, 10, 3, 10) is False
+    assert record.count == 1
+
+
+def test_fixed_window_misses_burst_straddling_boundary():
+    record = FloodRecord(0)
+    check_flood(record, fixed_window, 0, 3, 10)
+    # Five messages in 0.4s, split 2/3 across the window reset
+    assert send(record, fixed_window, [9.8, 9.9, 10.0, 10.1, 10.2], 3, 10) == [False] * 5
+
+
+def test_sliding_window_catches_burst_straddling_boundary():
+    record = FloodRecord(0)
+    check_flood(record, sliding_window, 0, 3, 10)
+    assert send(record, sliding_window, [9.8, 9.9, 10.0, 10.1, 10.2], 3, 10) == [
+        False, False, False, True, True,
+    ]
+
+
+def test_sliding_window_edge_is_exclusive():
+    record = FloodRecord(0)
+    send(record, sliding_window, [0, 1, 2], 3, 10)
+    # The 4th message is compared with the 1st: exactly `window` apart is allowed
+    assert check_flood(record, sliding_window, 10, 3, 10) is False
+    assert check_flood(record, sliding_window, 10.5, 3, 10) is True
+
+
+def test_token_bucket_refills_over_time():
+    record = FloodRecord(0)
+    assert send(record, token_bucket, [0, 0, 0, 0], 3, 3) == [False, False, False, True]
+    # One token per second comes back
+    assert check_flood(record, token_bucket, 1, 3, 3) is False
+    assert check_flood(record, token_bucket, 1, 3, 3) is True
+
+
+def test_token_bucket_never_exceeds_capacity():
+    record = FloodRecord(0)
+    send(record, token_bucket, [0], 3, 3)
+    assert send(record, token_bucket, [100, 100, 100, 100], 3, 3) == [False, False, False, True]
+
+
+@pytest.mark.parametrize("engine, flagged", [
+    (fixed_window, False),
+    (sliding_window, False),
+    # The bucket only grows as it refills, it has no stored tokens to spare
+    (token_bucket, True),
+])
+def test_raising_limit_mid_window(engine, flagged):
+    record = FloodRecord(0)
+    assert send(record, engine, [0, 0, 0, 0], 3, 10) == [False, False, False, True]
+    assert check_flood(record, engine, 0.1, 10, 10) is flagged
+
+
+def test_sliding_window_shrinking_limit():
+    record = FloodRecord(0)
+    send(record, sliding_window, [0, 1, 2, 3, 4], 5, 10)
+    assert check_flood(record, sliding_window, 5, 2, 10) is False
+    assert check_flood(record, sliding_window, 6, 2, 10) is False
+    assert check_flood(record, sliding_window, 7, 2, 10) is True
+
+
+def test_fixed_window_lowering_limit_applies_to_current_count():
+    record = FloodRecord(0)
+    send(record, fixed_window, [0, 1], 5, 10)
+    assert check_flood(record, fixed_window, 2, 2, 10) is True
+
+
+def test_engine_switch_round_trip_does_not_break_sliding_window():
+    record = FloodRecord(0)
+    send(record, sliding_window, [0, 1], 3, 10)
+    send(record, fixed_window, [2, 3, 4, 5, 6], 3, 10)
+    # Used to raise IndexError once the fixed count outgrew the old ring
+    assert send(record, sliding_window, [7, 8, 9, 9.5], 3, 10) == [False, False, False, True]
+
+
+def test_raw_engines_share_a_record_safely():
+    record = FloodRecord(0)
+    sliding_window(record, 0, 3, 10)
+    for now in range(1, 6):
+        fixed_window(record, now, 3, 10)
+    for now in range(6, 12):
+        sliding_window(record, now, 3, 10)
+
+
+@pytest.mark.parametrize("first, second", [
+    (fixed_window, token_bucket),
+    (token_bucket, fixed_window),
+    (sliding_window, token_bucket),
+])
+def test_engine_switch_starts_fresh(first, second):
+    record = FloodRecord(0)
+    send(record, first, [0, 0, 0, 0, 0], 3, 10)
+    assert send(record, second, [1, 1, 1], 3, 10) == [False] * 3
+
+
+@pytest.mark.parametrize("engine", [fixed_window, sliding_window, token_bucket])
+@pytest.mark.parametrize("limit", [0, -3])
+def test_non_positive_limit_never_floods(engine, limit):
+    record = FloodRecord(0)
+    # A negative limit used to make a zero-length sliding ring and IndexError
+    assert send(record, engine, [0, 0, 1, 2], limit, 10) == [False] * 4
+
+
+def test_store_expires_idle_records():
+    store = FloodStore(idle_timeout=10)
+    first = store.get(1, 1, now=0)
+    store.get(1, 2, now=5)
+    store.expire(now=12)
+    assert len(store) == 1
+    assert store.get(1, 1, now=12) is not first
+
+
+def test_store_keeps_records_for_long_windows():
+    store = FloodStore(idle_timeout=10)
+    window = 3600
+    record = store.get(1, 1, now=0, window=window)
+    for now in (0, 1000, 2000):
+        check_flood(store.get(1, 1, now=now, window=window), sliding_window, now, 3, window)
+    # Idle far beyond idle_timeout but still inside the chat's window
+    assert store.get(1, 1, now=3000, window=window) is record
+    assert check_flood(record, sliding_window, 3000, 3, window) is True
+
+
+def test_store_lru_cap():
+    store = FloodStore(max_entries=2)
+    store.get(1, 1, now=0)
+    store.get(1, 2, now=1)
+    store.get(1, 1, now=2)
+    store.get(1, 3, now=3)
+    assert len(store) == 2
+    # (1, 2) was the least recently seen sender
+    assert set(store._records) == {(1, 1), (1, 3)}
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from utils.wordmatch import AhoCorasickMatcher, RegexMatcher, compile_matcher
+
+# Word characters, separators and look-alikes that stress the \b checks
+ALPHABET = "abc_1é ж.-'!"
+
+
+def random_word(rng):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 4))).strip() or "a"
+
+
+def random_text(rng, words):
+    parts = []
+    for _ in range(rng.randint(0, 8)):
+        if words and rng.random() < 0.3:
+            parts.append(rng.choice(words))
+        else:
+            parts.append(random_word(rng))
+        parts.append(rng.choice(["", " ", "_", ".", "é", "!"]))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_aho_corasick_agrees_with_regex(seed):
+    rng = random.Random(seed)
+    words = list(dict.fromkeys(random_word(rng) for _ in range(rng.randint(1, 12))))
+    regex, automaton = RegexMatcher(words), AhoCorasickMatcher(words)
+    for _ in range(200):
+        text = random_text(rng, words)
+        assert automaton.search(text) == regex.search(text), (words, text)
+
+
+@pytest.mark.parametrize("words, text, expected", [
+    (["bad"], "bad_word", False),
+    (["bad"], "so bad!", True),
+    (["bad"], "ébad", False),
+    (["ab", "abc"], "abc", True),
+    (["abcd", "bc"], "abcd bc", True),
+    (["abcd", "bc"], "abce", False),
+    (["a.b"], "xa.b", False),
+    (["a.b"], "a.b c", True),
+])
+def test_word_boundaries(words, text, expected):
+    assert RegexMatcher(words).search(text) is expected
+    assert AhoCorasickMatcher(words).search(text) is expected
+
+
+def test_compile_matcher_skips_empty_words():
+    assert compile_matcher(["", ""]) is None
+    assert compile_matcher(["", "bad"]).search("bad")
@@ -0,0 +1,15 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import config
+
+# Synchronous database calls run here so they never block the event loop.
+# The pool is bounded so a slow database can't spawn unlimited threads.
+DB_EXECUTOR_WORKERS = getattr(config, "DB_EXECUTOR_WORKERS", 8)
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+
+async def run_sync(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+# Telegram accepts at most this many ids per delete_messages call
+DELETE_BATCH_SIZE = 100
+
+
+class ChatBatcher:
+    """Collects items per chat and hands them to `handler` in batches.
+
+    `handler(chat_id, items)` is awaited with at most `batch_size` items
+    at a time (all of them when `batch_size` is None). Each chat has its
+    own timer: its items are flushed `interval` seconds after the first
+    one was queued, or after the latest one when `debounce` is set.
+    Different chats are flushed concurrently.
+    """
+
+    def __init__(
+        self,
+        handler,
+        interval: float = 2.0,
+        batch_size: int = DELETE_BATCH_SIZE,
+        debounce: bool = False,
+    ):
+        self._handler = handler
+        self.interval = interval
+        self.batch_size = batch_size
+        self.debounce = debounce
+        self._pending = {}
+        self._deadlines = {}
+        self._timers = {}
+
+    def add(self, chat_id: int, items) -> int:
+        """Queue `items` and return how many are now pending for the chat."""
+        pending = self._pending.setdefault(chat_id, [])
+        pending.extend(items)
+        if self.debounce or chat_id not in self._deadlines:
+            self._deadlines[chat_id] = asyncio.get_running_loop().time() + self.interval
+        if chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+        return len(pending)
+
+    async def _flush_later(self, chat_id: int):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                delay = self._deadlines.get(chat_id, 0) - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                self._deadlines.pop(chat_id, None)
+                await self.flush(chat_id)
+                # Items queued while the handler ran have set a new deadline
+                if not self._pending.get(chat_id):
+                    break
+        finally:
+            self._deadlines.pop(chat_id, None)
+            self._timers.pop(chat_id, None)
+
+    async def _flush_chat(self, chat_id: int, items):
+        size = self.batch_size or len(items) or 1
+        for start in range(0, len(items), size):
+            try:
+                await self._handler(chat_id, items[start:start + size])
+            except Exception as e:
+                logging.exception(e)
+
+    async def flush(self, chat_id: int = None):
+        if chat_id is None:
+            pending, self._pending = self._pending, {}
+        else:
+            pending = {chat_id: self._pending.pop(chat_id, [])}
+        await asyncio.gather(
+            *(self._flush_chat(chat, items) for chat, items in pending.items() if items)
+        )
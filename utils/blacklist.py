@@ -0,0 +1,62 @@
+from Bad.database.blacklist_db import Blacklist
+from utils.async_db import run_sync
+
+
+class AsyncBlacklist:
+    """Awaitable wrapper around the synchronous Blacklist store."""
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self._db = None
+
+    def _get_db(self):
+        if self._db is None:
+            self._db = Blacklist(self.chat_id)
+        return self._db
+
+    async def _call(self, name: str, *args):
+        return await run_sync(lambda: getattr(self._get_db(), name)(*args))
+
+    async def get_blacklists(self):
+        return await self._call("get_blacklists")
+
+    async def add_blacklist(self, word: str):
+        return await self._call("add_blacklist", word)
+
+    async def add_blacklists(self, words):
+        """Add every new word in a single write and return the ones added."""
+
+        def call():
+            db = self._get_db()
+            present = set(db.get_blacklists())
+            added = [word for word in dict.fromkeys(words) if word not in present]
+            if added:
+                # $addToSet keeps concurrent imports from dropping each other's words
+                db.collection.update_one(
+                    {"_id": self.chat_id},
+                    {"$addToSet": {"triggers": {"$each": added}}},
+                    upsert=True,
+                )
+                # The instance's cached document is stale now
+                self._db = None
+            return added
+
+        return await run_sync(call)
+
+    async def remove_blacklist(self, word: str):
+        return await self._call("remove_blacklist", word)
+
+    async def rm_all_blacklist(self):
+        return await self._call("rm_all_blacklist")
+
+    async def get_action(self):
+        return await self._call("get_action")
+
+    async def set_action(self, action: str):
+        return await self._call("set_action", action)
+
+    async def get_reason(self):
+        return await self._call("get_reason")
+
+    async def set_reason(self, reason: str):
+        return await self._call("set_reason", reason)
@@ -0,0 +1,116 @@
+from Bad.core.mongo import mongodb
+from utils.async_db import run_sync
+from utils.singleflight import single_flight
+from utils.textfold import fold_text
+from utils.wordmatch import compile_matcher
+
+packs_collection = mongodb.blacklist_packs
+subscriptions_collection = mongodb.blacklist_pack_subscriptions
+
+# One compiled matcher per pack, shared by every subscribed chat
+_pack_versions = {}
+_pack_matchers = {}
+# chat_id -> tuple of subscribed pack names
+_chat_packs = {}
+
+
+def valid_pack_name(name: str) -> bool:
+    return name.replace("_", "").isalnum() and len(name) <= 32
+
+
+async def list_packs():
+    """Return [(name, version, word count)] for every pack."""
+    cursor = packs_collection.aggregate([
+        {"$project": {"name": 1, "version": 1, "count": {"$size": "$words"}}},
+        {"$sort": {"name": 1}},
+    ])
+    return [(doc["name"], doc["version"], doc["count"]) async for doc in cursor]
+
+
+async def pack_exists(name: str) -> bool:
+    return await packs_collection.count_documents({"name": name}, limit=1) > 0
+
+
+async def add_pack_words(name: str, words):
+    """Add words to a pack, creating it if needed; returns the ones added."""
+    words = list(dict.fromkeys(words))
+    doc = await packs_collection.find_one({"name": name}, {"words": 1})
+    present = set(doc["words"]) if doc else set()
+    added = [word for word in words if word not in present]
+    if added or not doc:
+        await packs_collection.update_one(
+            {"name": name},
+            {"$addToSet": {"words": {"$each": added}}, "$inc": {"version": 1}},
+            upsert=True,
+        )
+        _pack_versions[name] = _pack_versions.get(name, 0) + 1
+    return added
+
+
+async def remove_pack_words(name: str, words):
+    """Remove words from a pack; returns the ones that were in it."""
+    doc = await packs_collection.find_one({"name": name}, {"words": 1})
+    if not doc:
+        return []
+    present = set(doc["words"])
+    removed = [word for word in dict.fromkeys(words) if word in present]
+    if removed:
+        await packs_collection.update_one(
+            {"name": name},
+            {"$pull": {"words": {"$in": removed}}, "$inc": {"version": 1}},
+        )
+        _pack_versions[name] = _pack_versions.get(name, 0) + 1
+    return removed
+
+
+async def subscribed_packs(chat_id: int):
+    packs = _chat_packs.get(chat_id)
+    if packs is None:
+        doc = await subscriptions_collection.find_one({"chat_id": chat_id})
+        packs = _chat_packs[chat_id] = tuple(doc["packs"]) if doc else ()
+    return packs
+
+
+async def subscribe(chat_id: int, name: str) -> bool:
+    if name in await subscribed_packs(chat_id):
+        return False
+    await subscriptions_collection.update_one(
+        {"chat_id": chat_id}, {"$addToSet": {"packs": name}}, upsert=True
+    )
+    _chat_packs[chat_id] = _chat_packs[chat_id] + (name,)
+    return True
+
+
+async def unsubscribe(chat_id: int, name: str) -> bool:
+    packs = await subscribed_packs(chat_id)
+    if name not in packs:
+        return False
+    await subscriptions_collection.update_one({"chat_id": chat_id}, {"$pull": {"packs": name}})
+    _chat_packs[chat_id] = tuple(pack for pack in packs if pack != name)
+    return True
+
+
+async def _load_pack_matcher(name: str, version: int):
+    doc = await packs_collection.find_one({"name": name}, {"words": 1})
+    words = doc["words"] if doc else []
+    matcher = await run_sync(lambda: compile_matcher(fold_text(word) for word in words))
+    _pack_matchers[name] = (version, matcher)
+    return _pack_matchers[name]
+
+
+async def get_pack_matcher(name: str):
+    version = _pack_versions.get(name, 0)
+    cached = _pack_matchers.get(name)
+    if cached is None or cached[0] != version:
+        cached = await single_flight(("blacklist_pack", name, version), _load_pack_matcher, name, version)
+    return cached[1]
+
+
+async def chat_pack_matchers(chat_id: int):
+    """Shared matchers for every pack the chat subscribes to."""
+    matchers = []
+    for name in await subscribed_packs(chat_id):
+        matcher = await get_pack_matcher(name)
+        if matcher is not None:
+            matchers.append(matcher)
+    return matchers
@@ -0,0 +1,65 @@
+from pyrogram import filters
+from pyrogram.errors import UserNotParticipant
+from pyrogram.types import CallbackQuery
+
+from Bad import app
+from utils.permissions import Privilege, member_permissions
+
+
+class CallbackRouter:
+    """Dispatch table from callback-data prefix to handler.
+
+    Only the handler whose prefix matches runs, and the sender's
+    privileges are looked up only for routes registered with a
+    `permission`.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._prefixes = ()
+
+    def route(self, prefix: str, permission: str = None):
+        required = Privilege[permission.upper()] if permission else None
+
+        def decorator(func):
+            self._routes[prefix] = (func, permission, required)
+            # Longest first so "rmfed_" wins over "fed_"
+            self._prefixes = tuple(sorted(self._routes, key=len, reverse=True))
+            return func
+
+        return decorator
+
+    def match(self, data) -> str:
+        if isinstance(data, str):
+            for prefix in self._prefixes:
+                if data.startswith(prefix):
+                    return prefix
+        return None
+
+    async def dispatch(self, client, callback_query: CallbackQuery):
+        func, permission, required = self._routes[self.match(callback_query.data)]
+        if required is not None:
+            chat_id = callback_query.message.chat.id
+            try:
+                permissions = await member_permissions(chat_id, callback_query.from_user.id)
+            except UserNotParticipant:
+                return await callback_query.answer(
+                    "You are not a participant in this chat.", show_alert=True
+                )
+            if not permissions & required:
+                return await callback_query.answer(
+                    "ʏᴏᴜ ᴅᴏɴ'ᴛ ʜᴀᴠᴇ ᴇɴᴏᴜɢʜ ᴘᴇʀᴍɪssɪᴏɴs ᴛᴏ ᴘᴇʀғᴏʀᴍ ᴛʜɪs ᴀᴄᴛɪᴏɴ\n"
+                    + f"ᴘᴇʀᴍɪssɪᴏɴ ɴᴇᴇᴅᴇᴅ: {permission}",
+                    show_alert=True,
+                )
+        return await func(client, callback_query)
+
+
+callback_router = CallbackRouter()
+
+
+@app.on_callback_query(
+    filters.create(lambda _, __, query: callback_router.match(query.data) is not None)
+)
+async def _route_callback(client, callback_query: CallbackQuery):
+    await callback_router.dispatch(client, callback_query)
@@ -0,0 +1,34 @@
+import time
+from collections import OrderedDict
+
+
+class ActionLedger:
+    """Remembers recent (chat, user, action) enforcements for `ttl` seconds.
+
+    Entries share one TTL, so insertion order is also expiry order and
+    pruning only ever looks at the oldest entries.
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _prune(self, now: float):
+        entries = self._entries
+        while entries:
+            key, expires = next(iter(entries.items()))
+            if expires > now and len(entries) <= self.max_entries:
+                break
+            del entries[key]
+
+    def first(self, chat_id: int, user_id: int, action: str, now: float = None) -> bool:
+        """Record the action and return True unless it was already taken within the TTL."""
+        now = time.monotonic() if now is None else now
+        self._prune(now)
+        key = (chat_id, user_id, action)
+        if key in self._entries:
+            return False
+        self._entries[key] = now + self.ttl
+        return True
+
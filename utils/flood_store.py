@@ -0,0 +1,152 @@
+import sys
+from array import array
+from collections import OrderedDict, deque
+from math import inf
+from time import monotonic
+
+
+class FloodRecord:
+    __slots__ = (
+        "stamp", "count", "tokens", "ring", "slot", "engine", "seen", "keep",
+        "exempt", "exempt_until", "acted_until", "burst",
+    )
+
+    def __init__(self, now: float):
+        self.stamp = now  # window start, or last refill for the token bucket
+        self.count = 0  # messages in the fixed window
+        self.tokens = None
+        self.ring = None  # timestamps of the last `limit` messages
+        self.slot = 0  # next ring slot to overwrite
+        self.engine = None  # engine that owns the state above
+        self.seen = now  # last message, used for idle expiry
+        self.keep = 0.0  # idle seconds before the record may expire
+        self.exempt = False  # admin check result, valid until exempt_until
+        self.exempt_until = -inf
+        self.acted_until = -inf  # flood action already taken in this window
+        self.burst = None  # ids of the sender's most recent messages
+
+
+def remember_message(record: FloodRecord, message_id: int, size: int) -> deque:
+    burst = record.burst
+    if burst is None or burst.maxlen != size:
+        burst = record.burst = deque(burst or (), maxlen=size)
+    burst.append(message_id)
+    return burst
+
+
+# Each engine records one message at `now` and returns True when the
+# sender is over `limit` messages per `window` seconds, in O(1) per message.
+
+def fixed_window(record: FloodRecord, now: float, limit: int, window: float) -> bool:
+    if now - record.stamp >= window:
+        record.stamp = now
+        record.count = 0
+    record.count += 1
+    return record.count > limit
+
+
+def sliding_window(record: FloodRecord, now: float, limit: int, window: float) -> bool:
+    ring = record.ring
+    if ring is None or len(ring) != limit:
+        ring = record.ring = array("d", [-inf]) * limit
+        record.slot = 0
+    pos = record.slot
+    # The slot being overwritten holds the message sent `limit` messages ago
+    oldest = ring[pos]
+    ring[pos] = now
+    record.slot = (pos + 1) % limit
+    return now - oldest < window
+
+
+def token_bucket(record: FloodRecord, now: float, limit: int, window: float) -> bool:
+    if record.tokens is None:
+        tokens = limit
+    else:
+        tokens = min(limit, record.tokens + (now - record.stamp) * limit / window)
+    record.stamp = now
+    if tokens >= 1:
+        record.tokens = tokens - 1
+        return False
+    record.tokens = tokens
+    return True
+
+
+FLOOD_ENGINES = {
+    "fixed": fixed_window,
+    "sliding": sliding_window,
+    "bucket": token_bucket,
+}
+
+
+def check_flood(record: FloodRecord, engine, now: float, limit: int, window: float) -> bool:
+    """Run `engine` on the record, starting fresh if another engine last used it.
+
+    A limit below 1 (antiflood off, or a bad stored setting) never floods.
+    """
+    if limit < 1:
+        return False
+    if record.engine is not engine:
+        record.engine = engine
+        record.stamp = now
+        record.count = 0
+        record.tokens = None
+        record.ring = None
+        record.slot = 0
+    return engine(record, now, limit, window)
+
+
+class FloodStore:
+    """Per (chat, user) flood counters with idle expiry and an LRU size cap.
+
+    Records are kept in last-seen order, so both idle expiry and LRU
+    eviction only ever pop from the front.
+    """
+
+    def __init__(self, max_entries: int = 50000, idle_timeout: float = 900):
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout
+        self._records = OrderedDict()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, chat_id: int, user_id: int, now: float = None, window: float = 0) -> FloodRecord:
+        """Return the sender's record, kept for at least `window` idle seconds."""
+        now = monotonic() if now is None else now
+        self.expire(now)
+        key = (chat_id, user_id)
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = FloodRecord(now)
+            if len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+        else:
+            self._records.move_to_end(key)
+        record.seen = now
+        record.keep = max(self.idle_timeout, window)
+        return record
+
+    def discard(self, chat_id: int, user_id: int):
+        self._records.pop((chat_id, user_id), None)
+
+    def expire(self, now: float = None):
+        now = monotonic() if now is None else now
+        records = self._records
+        while records:
+            key, record = next(iter(records.items()))
+            # A record whose window outlasts idle_timeout holds back the ones
+            # behind it until it expires; the LRU cap still bounds the store
+            if now - record.seen <= record.keep:
+                break
+            del records[key]
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the store, records and keys included."""
+        size = sys.getsizeof(self._records)
+        for key, record in self._records.items():
+            size += sys.getsizeof(key) + sys.getsizeof(record)
+            if record.ring is not None:
+                size += sys.getsizeof(record.ring)
+            if record.burst is not None:
+                size += sys.getsizeof(record.burst)
+        return size
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+from collections import deque
+from time import monotonic
+
+from pyrogram.errors import FloodWait
+
+import config
+
+# Priority lanes, most urgent first
+MODERATION, GREETING, BROADCAST = 0, 1, 2
+LANE_NAMES = ("moderation", "greeting", "broadcast")
+
+# How far down a lane to look for a job whose chat isn't rate limited
+_SCAN_DEPTH = 50
+
+# Lane metrics are logged at most this often while the gateway is busy
+GATEWAY_METRICS_INTERVAL = getattr(config, "GATEWAY_METRICS_INTERVAL", 300)
+
+# Longest a handler waits on call() before giving up on the result; the
+# job itself stays queued and is still sent
+GATEWAY_CALL_TIMEOUT = getattr(config, "GATEWAY_CALL_TIMEOUT", 10)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Job:
+    __slots__ = ("chat_id", "func", "args", "kwargs", "future", "queued_at")
+
+    def __init__(self, chat_id, func, args, kwargs, future):
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = monotonic()
+
+
+def _retry_after(exc: Exception):
+    """Seconds to back off for pyrogram's FloodWait or PTB's RetryAfter."""
+    if isinstance(exc, FloodWait):
+        return float(exc.value)
+    retry_after = getattr(exc, "retry_after", None)
+    if retry_after is None:
+        return None
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.warning(f"gateway call failed: {future.exception()!r}")
+
+
+class ApiGateway:
+    """Single outbound path for Telegram write calls (and bulk reads).
+
+    Calls are queued in priority lanes and released under a global token
+    bucket plus one bucket per chat. Moderation goes ahead of greetings,
+    greetings ahead of broadcasts. A FloodWait pauses only the lane that
+    hit it; the call is retried once the pause is over.
+    """
+
+    def __init__(self, rate: float, chat_rate: float, chat_burst: float):
+        self._global = TokenBucket(rate, rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chats = {}
+        self._lanes = [deque() for _ in LANE_NAMES]
+        self._paused_until = [0.0] * len(LANE_NAMES)
+        self._stats = [
+            {"sent": 0, "wait_total": 0.0, "wait_max": 0.0, "flood_waits": 0}
+            for _ in LANE_NAMES
+        ]
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+        self._next_report = monotonic() + GATEWAY_METRICS_INTERVAL
+
+    async def call(self, lane: int, chat_id, func, *args, **kwargs):
+        """Queue `func(*args, **kwargs)` on `lane` and return its result.
+
+        Raises asyncio.TimeoutError if the result isn't back within
+        GATEWAY_CALL_TIMEOUT seconds, e.g. while the lane is paused.
+
+        `chat_id` selects the per-chat limiter; pass None for calls that
+        aren't aimed at a chat.
+        """
+        future = self.queue(lane, chat_id, func, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), GATEWAY_CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            future.add_done_callback(_log_failure)
+            raise
+
+    def submit(self, lane: int, chat_id, func, *args, **kwargs) -> asyncio.Future:
+        """Queue `func(*args, **kwargs)` without waiting for it.
+
+        For calls whose result the caller doesn't need; failures are logged.
+        """
+        future = self.queue(lane, chat_id, func, *args, **kwargs)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def queue(self, lane: int, chat_id, func, *args, **kwargs) -> asyncio.Future:
+        """Queue the call and return its future.
+
+        Awaiting the future waits without a time limit, which only suits
+        background tasks (batch flushes, fed-wide sweeps), not handlers.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].append(_Job(chat_id, func, args, kwargs, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return future
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= 10000:
+                now = monotonic()
+                for key in [k for k, b in self._chats.items() if b.delay(now) == 0]:
+                    del self._chats[key]
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _pick(self, now: float):
+        """Return (lane, job, None) for the next sendable call, or
+        (None, None, wait) with the seconds until one may be sendable."""
+        wait = None
+        for lane, jobs in enumerate(self._lanes):
+            if not jobs:
+                continue
+            paused = self._paused_until[lane] - now
+            if paused > 0:
+                wait = paused if wait is None else min(wait, paused)
+                continue
+            for index, job in enumerate(jobs):
+                if index >= _SCAN_DEPTH:
+                    break
+                delay = 0.0 if job.chat_id is None else self._chat_bucket(job.chat_id).delay(now)
+                if delay == 0:
+                    del jobs[index]
+                    return lane, job, None
+                wait = delay if wait is None else min(wait, delay)
+        return None, None, wait
+
+    async def _run(self):
+        while True:
+            now = monotonic()
+            if GATEWAY_METRICS_INTERVAL and now >= self._next_report:
+                self._next_report = now + GATEWAY_METRICS_INTERVAL
+                self.log_metrics()
+            wait = self._global.delay(now)
+            if wait == 0:
+                lane, job, wait = self._pick(now)
+                if job is not None:
+                    self._global.take(now)
+                    if job.chat_id is not None:
+                        self._chat_bucket(job.chat_id).take(now)
+                    task = asyncio.create_task(self._execute(lane, job, now))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+                    continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record(self, lane: int, job: _Job, now: float):
+        # Once per job, when its final attempt starts, so retries don't count twice
+        stats = self._stats[lane]
+        waited = now - job.queued_at
+        stats["sent"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+
+    async def _execute(self, lane: int, job: _Job, now: float):
+        stats = self._stats[lane]
+        try:
+            result = await job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            retry_after = _retry_after(e)
+            if retry_after is None:
+                self._record(lane, job, now)
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            logging.warning(f"{LANE_NAMES[lane]} lane paused for {retry_after}s by FloodWait")
+            stats["flood_waits"] += 1
+            self._paused_until[lane] = max(self._paused_until[lane], monotonic() + retry_after)
+            self._lanes[lane].appendleft(job)
+            self._wakeup.set()
+            return
+        self._record(lane, job, now)
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def metrics(self) -> dict:
+        now = monotonic()
+        metrics = {}
+        for lane, name in enumerate(LANE_NAMES):
+            stats = self._stats[lane]
+            metrics[name] = {
+                "queued": len(self._lanes[lane]),
+                "paused_for": max(0.0, self._paused_until[lane] - now),
+                "sent": stats["sent"],
+                "avg_wait": stats["wait_total"] / stats["sent"] if stats["sent"] else 0.0,
+                "max_wait": stats["wait_max"],
+                "flood_waits": stats["flood_waits"],
+            }
+        return metrics
+
+    def log_metrics(self):
+        logging.info(
+            "gateway: "
+            + "; ".join(
+                f"{name} queued={m['queued']} paused={m['paused_for']:.1f}s sent={m['sent']} "
+                f"avg_wait={m['avg_wait']:.2f}s max_wait={m['max_wait']:.2f}s "
+                f"flood_waits={m['flood_waits']}"
+                for name, m in self.metrics().items()
+            )
+        )
+
+
+gateway = ApiGateway(
+    rate=getattr(config, "GATEWAY_RATE", 25),
+    chat_rate=getattr(config, "GATEWAY_CHAT_RATE", 1),
+    chat_burst=getattr(config, "GATEWAY_CHAT_BURST", 5),
+)
@@ -0,0 +1,131 @@
+from datetime import datetime
+from html import escape
+from secrets import choice
+from string import Formatter
+from typing import NamedTuple, Optional
+
+from pyrogram import enums
+from pyrogram.types import ChatMemberUpdated
+
+from Bad.database.kbhelpersdb import ikb
+from Bad.database.parserdb import mention_html
+from Bad.database.stringdb import (build_keyboard, escape_invalid_curly_brackets,
+                                 parse_button)
+
+GREETING_FIELDS = [
+    "first",
+    "last",
+    "fullname",
+    "username",
+    "mention",
+    "id",
+    "chatname",
+    "time",
+    "totalmember",
+]
+
+
+class RenderPlan(NamedTuple):
+    """A greeting compiled once; only the placeholders are filled per join."""
+
+    variants: tuple
+    keyboard: Optional[object]
+    buttons: list  # kept only when button text/urls have placeholders
+    placeholders: frozenset
+
+
+# (chat_id, kind) -> (source text, plan)
+_plans = {}
+
+
+def _placeholders(texts):
+    return frozenset(
+        field
+        for text in texts
+        for _, field, _, _ in Formatter().parse(text)
+        if field
+    )
+
+
+async def compile_plan(text: str, default: str) -> RenderPlan:
+    teks = await escape_invalid_curly_brackets(text or "", GREETING_FIELDS)
+    # Buttons are parsed before formatting so user names can't inject any
+    tek, buttons = await parse_button(teks or "")
+    # Empty variants (e.g. a trailing %%%) would send an empty message
+    variants = tuple(variant for variant in tek.split("%%%") if variant.strip())
+    if not variants:
+        variants = (await escape_invalid_curly_brackets(default, GREETING_FIELDS),)
+    button_texts = [part for button in buttons for part in button[:2]]
+    if any("{" in part for part in button_texts):
+        keyboard = None
+    else:
+        keyboard = await build_keyboard(buttons)
+        keyboard = ikb(keyboard) if keyboard else None
+        buttons = []
+    return RenderPlan(variants, keyboard, buttons, _placeholders(variants + tuple(button_texts)))
+
+
+async def greeting_plan(chat_id: int, kind: str, text: str, default: str) -> RenderPlan:
+    """Plan for the chat's current welcome/goodbye text, compiled on change."""
+    cached = _plans.get((chat_id, kind))
+    if cached and cached[0] == text:
+        return cached[1]
+    plan = await compile_plan(text, default)
+    _plans[(chat_id, kind)] = (text, plan)
+    return plan
+
+
+def _user(m: ChatMemberUpdated, n: bool):
+    if n:
+        return m.new_chat_member.user if m.new_chat_member else m.from_user
+    return m.old_chat_member.user if m.old_chat_member else m.from_user
+
+
+async def _fields(placeholders, members, n: bool, count_members):
+    # Per-user fields are joined when one greeting covers several members
+    users = [_user(m, n) for m in members]
+    firsts = [escape(user.first_name) for user in users]
+    fields = {}
+    if placeholders & {"mention", "username"}:
+        mentions = [await mention_html(first, user.id) for first, user in zip(firsts, users)]
+        fields["mention"] = ", ".join(mentions)
+        fields["username"] = ", ".join(
+            "@" + user.username if user.username else mention
+            for user, mention in zip(users, mentions)
+        )
+    if "first" in placeholders:
+        fields["first"] = ", ".join(firsts)
+    if "last" in placeholders:
+        fields["last"] = ", ".join(escape(user.last_name or user.first_name) for user in users)
+    if "fullname" in placeholders:
+        fields["fullname"] = ", ".join(
+            f"{first} {escape(user.last_name)}" if user.last_name else first
+            for first, user in zip(firsts, users)
+        )
+    if "chatname" in placeholders:
+        chat = members[0].chat
+        fields["chatname"] = escape(chat.title) if chat.type != enums.ChatType.PRIVATE else firsts[0]
+    if "id" in placeholders:
+        fields["id"] = ", ".join(str(user.id) for user in users)
+    if "time" in placeholders:
+        fields["time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if "totalmember" in placeholders:
+        fields["totalmember"] = await count_members()
+    return fields
+
+
+async def render_greeting(plan: RenderPlan, members, n: bool, count_members=None):
+    """Return (text, reply_markup) greeting `members` on join (n=True) or leave.
+
+    `count_members` is awaited only when the text uses {totalmember}.
+    """
+    fields = await _fields(plan.placeholders, members, n, count_members)
+    text = choice(plan.variants).format(**fields)
+    keyboard = plan.keyboard
+    if plan.buttons:
+        rows = await build_keyboard(
+            [(name.format(**fields), url.format(**fields), same_line) for name, url, same_line in plan.buttons]
+        )
+        keyboard = ikb(rows) if rows else None
+    return text, keyboard
+
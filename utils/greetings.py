@@ -0,0 +1,93 @@
+from time import monotonic
+from typing import NamedTuple, Optional
+
+from Bad.database.greetings_db import Greetings
+from utils.async_db import run_sync
+from utils.singleflight import single_flight
+
+# Snapshots are dropped on every set_*; the TTL only bounds staleness
+# from writes made outside this process
+GREETINGS_CACHE_TTL = 600
+
+
+class GreetingSnapshot(NamedTuple):
+    """Everything the join/leave handlers read, loaded in one go."""
+
+    welcome: bool
+    welcome_text: str
+    welcome_media: Optional[str]
+    welcome_mtype: Optional[int]
+    cleanwelcome: bool
+    cleanwelcome_id: Optional[int]
+    goodbye: bool
+    goodbye_text: str
+    goodbye_media: Optional[str]
+    goodbye_mtype: Optional[int]
+    cleangoodbye: bool
+    cleangoodbye_id: Optional[int]
+    cleanservice: bool
+
+
+# chat_id -> (expires, snapshot, Greetings instance reused for writes)
+_snapshots = {}
+_generations = {}
+
+
+def invalidate_greetings(chat_id: int):
+    _generations[chat_id] = _generations.get(chat_id, 0) + 1
+    _snapshots.pop(chat_id, None)
+
+
+def _read_snapshot(chat_id: int):
+    # Greetings loads the chat document once; the getters read from it
+    db = Greetings(chat_id)
+    snapshot = GreetingSnapshot(
+        welcome=db.get_welcome_status(),
+        welcome_text=db.get_welcome_text(),
+        welcome_media=db.get_welcome_media(),
+        welcome_mtype=db.get_welcome_msgtype(),
+        cleanwelcome=db.get_current_cleanwelcome_settings(),
+        cleanwelcome_id=db.get_current_cleanwelcome_id(),
+        goodbye=db.get_goodbye_status(),
+        goodbye_text=db.get_goodbye_text(),
+        goodbye_media=db.get_goodbye_media(),
+        goodbye_mtype=db.get_goodbye_msgtype(),
+        cleangoodbye=db.get_current_cleangoodbye_settings(),
+        cleangoodbye_id=db.get_current_cleangoodbye_id(),
+        cleanservice=db.get_current_cleanservice_settings(),
+    )
+    return snapshot, db
+
+
+async def _load_snapshot(chat_id: int, generation: int):
+    snapshot, db = await run_sync(_read_snapshot, chat_id)
+    # A set_* that ran while we were reading makes this snapshot stale
+    if _generations.get(chat_id, 0) == generation:
+        _snapshots[chat_id] = (monotonic() + GREETINGS_CACHE_TTL, snapshot, db)
+    return snapshot
+
+
+async def get_greetings(chat_id: int) -> GreetingSnapshot:
+    cached = _snapshots.get(chat_id)
+    if cached and cached[0] > monotonic():
+        return cached[1]
+    generation = _generations.get(chat_id, 0)
+    return await single_flight(("greetings", chat_id, generation), _load_snapshot, chat_id, generation)
+
+
+async def _remember_clean_id(chat_id: int, field: str, setter: str, message_id: int):
+    cached = _snapshots.get(chat_id)
+    if cached:
+        expires, snapshot, db = cached
+        _snapshots[chat_id] = (expires, snapshot._replace(**{field: message_id}), db)
+    else:
+        db = None
+    await run_sync(lambda: getattr(db or Greetings(chat_id), setter)(message_id))
+
+
+async def set_cleanwelcome_id(chat_id: int, message_id: int):
+    await _remember_clean_id(chat_id, "cleanwelcome_id", "set_cleanwlcm_id", message_id)
+
+
+async def set_cleangoodbye_id(chat_id: int, message_id: int):
+    await _remember_clean_id(chat_id, "cleangoodbye_id", "set_cleangoodbye_id", message_id)
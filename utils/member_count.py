@@ -0,0 +1,51 @@
+from time import monotonic
+
+from pyrogram import filters
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.types import ChatMember, ChatMemberUpdated
+
+import config
+from Bad import app
+from utils.singleflight import single_flight
+
+# Counts are seeded with one API call, then kept current from join/leave
+# updates; the resync corrects drift from updates the bot never saw
+MEMBER_COUNT_RESYNC = getattr(config, "MEMBER_COUNT_RESYNC", 3600)
+
+_PRESENT_STATUSES = (
+    ChatMemberStatus.OWNER,
+    ChatMemberStatus.ADMINISTRATOR,
+    ChatMemberStatus.MEMBER,
+)
+
+# chat_id -> [count, resync_at]
+_member_counts = {}
+
+
+def _is_present(member: ChatMember) -> bool:
+    if member is None:
+        return False
+    if member.status == ChatMemberStatus.RESTRICTED:
+        return bool(member.is_member)
+    return member.status in _PRESENT_STATUSES
+
+
+@app.on_chat_member_updated(filters.group, group=-2)
+async def _track_member_count(_, update: ChatMemberUpdated):
+    entry = _member_counts.get(update.chat.id)
+    if entry is None:
+        return  # not seeded yet; the first lookup fetches the real count
+    entry[0] += _is_present(update.new_chat_member) - _is_present(update.old_chat_member)
+
+
+async def _seed_member_count(chat_id: int) -> int:
+    count = await app.get_chat_members_count(chat_id)
+    _member_counts[chat_id] = [count, monotonic() + MEMBER_COUNT_RESYNC]
+    return count
+
+
+async def member_count(chat_id: int) -> int:
+    entry = _member_counts.get(chat_id)
+    if entry and entry[1] > monotonic():
+        return entry[0]
+    return await single_flight(("member_count", chat_id), _seed_member_count, chat_id)
@@ -1,38 +1,173 @@
+import asyncio
 import logging
+from enum import IntFlag
 from functools import wraps
+from time import monotonic
 from traceback import format_exc as err
 
+from pyrogram import filters
+from pyrogram.enums import ChatMembersFilter, ChatMemberStatus
+from pyrogram.errors import RPCError, UserNotParticipant
 from pyrogram.errors.exceptions.forbidden_403 import ChatWriteForbidden
-from pyrogram.types import Message
+from pyrogram.types import ChatMemberUpdated, Message
 
 from Bad import app
 from Bad.misc import SUDOERS
+from utils.singleflight import get_chat_member, single_flight
 
+class Privilege(IntFlag):
+    CAN_POST_MESSAGES = 1 << 0
+    CAN_EDIT_MESSAGES = 1 << 1
+    CAN_DELETE_MESSAGES = 1 << 2
+    CAN_RESTRICT_MEMBERS = 1 << 3
+    CAN_PROMOTE_MEMBERS = 1 << 4
+    CAN_CHANGE_INFO = 1 << 5
+    CAN_INVITE_USERS = 1 << 6
+    CAN_PIN_MESSAGES = 1 << 7
+    CAN_MANAGE_VIDEO_CHATS = 1 << 8
 
+
+# (ChatPrivileges attribute, bit) pairs, e.g. ("can_pin_messages", 128)
+_PRIVILEGE_BITS = tuple((flag.name.lower(), flag.value) for flag in Privilege)
+
+ADMIN_STATUSES = (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+
+# chat_id -> (expires_at, {user_id: (status, perms)}), or None when the
+# admin list can't be fetched and single lookups are used instead
+ADMIN_ROSTER_TTL = 600
+ADMIN_ROSTER_RETRY = 60
+_admin_rosters = {}
+
+# (chat_id, user_id) -> (expires_at, (status, perms))
+PERMISSION_CACHE_TTL = 300
+PERMISSION_CACHE_MAX = 20000
+_permission_cache = {}
+permission_cache_stats = {"hits": 0, "misses": 0}
+
+# chat_id -> (expires_at, perms), refreshed from my_chat_member updates
+BOT_PERMISSION_CACHE_TTL = 3600
+_bot_permission_cache = {}
+
+
+def invalidate_member_permissions(chat_id: int, user_id: int = None):
+    if user_id is not None:
+        _permission_cache.pop((chat_id, user_id), None)
+        return
+    _admin_rosters.pop(chat_id, None)
+    for key in [key for key in _permission_cache if key[0] == chat_id]:
+        del _permission_cache[key]
+
+
+def _prune_permission_cache():
+    now = monotonic()
+    for key in [key for key, (expires, _) in _permission_cache.items() if expires <= now]:
+        del _permission_cache[key]
+    if len(_permission_cache) >= PERMISSION_CACHE_MAX:
+        _permission_cache.clear()
+
+
+@app.on_chat_member_updated(filters.group, group=-1)
+async def _drop_stale_permissions(_, update: ChatMemberUpdated):
+    member = update.new_chat_member or update.old_chat_member
+    if not (member and member.user):
+        return
+    chat_id = update.chat.id
+    invalidate_member_permissions(chat_id, member.user.id)
+    # Rebuilt lazily on the next lookup
+    if any(
+        m and m.status in ADMIN_STATUSES
+        for m in (update.old_chat_member, update.new_chat_member)
+    ):
+        _admin_rosters.pop(chat_id, None)
+    if member.user.id == app.id:
+        if update.new_chat_member:
+            _bot_permission_cache[chat_id] = (
+                monotonic() + BOT_PERMISSION_CACHE_TTL,
+                _privileges_to_perms(update.new_chat_member.privileges),
+            )
+        else:
+            _bot_permission_cache.pop(chat_id, None)
+
+
+async def admin_roster(chat_id: int):
+    cached = _admin_rosters.get(chat_id)
+    if cached and cached[0] > monotonic():
+        return cached[1]
+    return await single_flight(("admin_roster", chat_id), _build_admin_roster, chat_id)
+
+
+async def _build_admin_roster(chat_id: int):
+    # One miss per roster fetch, however many lookups were waiting on it
+    permission_cache_stats["misses"] += 1
+    roster = {}
+    try:
+        async for member in app.get_chat_members(
+            chat_id, filter=ChatMembersFilter.ADMINISTRATORS
+        ):
+            roster[member.user.id] = (
+                member.status,
+                _privileges_to_perms(member.privileges),
+            )
+    except RPCError:
+        _admin_rosters[chat_id] = (monotonic() + ADMIN_ROSTER_RETRY, None)
+        return None
+    _admin_rosters[chat_id] = (monotonic() + ADMIN_ROSTER_TTL, roster)
+    return roster
+
+
+async def _member_entry(chat_id: int, user_id: int):
+    cached = _admin_rosters.get(chat_id)
+    roster_cached = cached is not None and cached[0] > monotonic()
+    roster = await admin_roster(chat_id)
+    if roster is not None:
+        if roster_cached:
+            permission_cache_stats["hits"] += 1
+        return roster.get(user_id, _NOT_ADMIN)
+
+    key = (chat_id, user_id)
+    cached = _permission_cache.get(key)
+    if cached and cached[0] > monotonic():
+        permission_cache_stats["hits"] += 1
+        return cached[1]
+    permission_cache_stats["misses"] += 1
+    member = await get_chat_member(chat_id, user_id)
+    entry = (member.status, _privileges_to_perms(member.privileges))
+    if len(_permission_cache) >= PERMISSION_CACHE_MAX:
+        _prune_permission_cache()
+    _permission_cache[key] = (monotonic() + PERMISSION_CACHE_TTL, entry)
+    return entry
+
+
+# Permissions are plain int masks of Privilege bits:
+# `perms & Privilege.CAN_RESTRICT_MEMBERS`
 async def member_permissions(chat_id: int, user_id: int):
-    perms = []
-    member = (await app.get_chat_member(chat_id, user_id)).privileges
-    if not member:
-        return []
-    if member.can_post_messages:
-        perms.append("can_post_messages")
-    if member.can_edit_messages:
-        perms.append("can_edit_messages")
-    if member.can_delete_messages:
-        perms.append("can_delete_messages")
-    if member.can_restrict_members:
-        perms.append("can_restrict_members")
-    if member.can_promote_members:
-        perms.append("can_promote_members")
-    if member.can_change_info:
-        perms.append("can_change_info")
-    if member.can_invite_users:
-        perms.append("can_invite_users")
-    if member.can_pin_messages:
-        perms.append("can_pin_messages")
-    if member.can_manage_video_chats:
-        perms.append("can_manage_video_chats")
-    return perms
+    return (await _member_entry(chat_id, user_id))[1]
+
+
+async def is_admin(chat_id: int, user_id: int):
+    try:
+        return (await _member_entry(chat_id, user_id))[0] in ADMIN_STATUSES
+    except UserNotParticipant:
+        return False
+
+
+async def is_owner(chat_id: int, user_id: int):
+    try:
+        return (await _member_entry(chat_id, user_id))[0] == ChatMemberStatus.OWNER
+    except UserNotParticipant:
+        return False
+
+
+def _privileges_to_perms(privileges):
+    mask = 0
+    if privileges:
+        for attr, bit in _PRIVILEGE_BITS:
+            if getattr(privileges, attr, False):
+                mask |= bit
+    return mask
+
+
+_NOT_ADMIN = (ChatMemberStatus.MEMBER, 0)
 
 
 async def authorised(func, subFunc2, client, message, *args, **kwargs):
@@ -74,19 +209,37 @@ async def unauthorised(
 
 
 async def bot_permissions(chat_id: int):
-    perms = []
-    return await member_permissions(chat_id, app.id)
+    cached = _bot_permission_cache.get(chat_id)
+    if cached and cached[0] > monotonic():
+        return cached[1]
+    perms = await member_permissions(chat_id, app.id)
+    _bot_permission_cache[chat_id] = (monotonic() + BOT_PERMISSION_CACHE_TTL, perms)
+    return perms
 
 
 def adminsOnly(permission):
+    required = Privilege[permission.upper()]
+
     def subFunc(func):
         @wraps(func)
         async def subFunc2(client, message: Message, *args, **kwargs):
             chatID = message.chat.id
 
+            # Look up the bot and the sender together so a cold cache
+            # costs one round trip instead of two
+            if message.from_user:
+                bot_perms, permissions = await asyncio.gather(
+                    bot_permissions(chatID),
+                    member_permissions(chatID, message.from_user.id),
+                    return_exceptions=True,
+                )
+            else:
+                bot_perms, permissions = await bot_permissions(chatID), None
+            if isinstance(bot_perms, BaseException):
+                raise bot_perms
+
             # Check if the bot has the required permission
-            bot_perms = await bot_permissions(chatID)
-            if permission not in bot_perms:
+            if not bot_perms & required:
                 return await unauthorised(
                     message, permission, subFunc2, bot_lacking_permission=True
                 )
@@ -106,8 +259,9 @@ def adminsOnly(permission):
 
             # For admins and sudo users
             userID = message.from_user.id
-            permissions = await member_permissions(chatID, userID)
-            if userID not in SUDOERS and permission not in permissions:
+            if isinstance(permissions, BaseException):
+                raise permissions
+            if userID not in SUDOERS and not permissions & required:
                 return await unauthorised(message, permission, subFunc2)
             return await authorised(func, subFunc2, client, message, *args, **kwargs)
 
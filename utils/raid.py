@@ -0,0 +1,55 @@
+from time import monotonic
+
+import config
+from utils.flood_store import FloodStore, sliding_window
+
+_JOINS, _FLOODS = 0, 1
+
+
+class RaidMonitor:
+    """Per-chat raid detection from join and flood-trigger rates.
+
+    A chat enters raid mode when it sees more than `join_limit` joins or
+    `flood_limit` flood triggers within `window` seconds, and leaves it
+    once `cooldown` seconds pass without either rate being exceeded.
+    """
+
+    def __init__(self, join_limit: int, flood_limit: int, window: float, cooldown: float):
+        self.join_limit = join_limit
+        self.flood_limit = flood_limit
+        self.window = window
+        self.cooldown = cooldown
+        self._rates = FloodStore(max_entries=20000, idle_timeout=window)
+        self._active_until = {}
+
+    def _hit(self, chat_id: int, kind: int, limit: int) -> bool:
+        now = monotonic()
+        record = self._rates.get(chat_id, kind, now)
+        if sliding_window(record, now, limit, self.window):
+            self._active_until[chat_id] = now + self.cooldown
+        return self.is_active(chat_id, now)
+
+    def record_join(self, chat_id: int) -> bool:
+        """Count a join; returns whether the chat is in raid mode."""
+        return self._hit(chat_id, _JOINS, self.join_limit)
+
+    def record_flood(self, chat_id: int) -> bool:
+        """Count a flood trigger; returns whether the chat is in raid mode."""
+        return self._hit(chat_id, _FLOODS, self.flood_limit)
+
+    def is_active(self, chat_id: int, now: float = None) -> bool:
+        until = self._active_until.get(chat_id)
+        if until is None:
+            return False
+        if (monotonic() if now is None else now) < until:
+            return True
+        del self._active_until[chat_id]
+        return False
+
+
+raid_monitor = RaidMonitor(
+    join_limit=getattr(config, "RAID_JOIN_LIMIT", 10),
+    flood_limit=getattr(config, "RAID_FLOOD_LIMIT", 5),
+    window=getattr(config, "RAID_WINDOW", 30),
+    cooldown=getattr(config, "RAID_COOLDOWN", 120),
+)
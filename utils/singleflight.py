@@ -0,0 +1,31 @@
+import asyncio
+
+from Bad import app
+
+# key -> future of the call currently in flight for that key
+_in_flight = {}
+
+
+async def single_flight(key, func, *args, **kwargs):
+    future = _in_flight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(func(*args, **kwargs))
+        _in_flight[key] = future
+
+        def _done(_):
+            if _in_flight.get(key) is future:
+                del _in_flight[key]
+
+        future.add_done_callback(_done)
+    # A cancelled waiter must not cancel the call the others are sharing
+    return await asyncio.shield(future)
+
+
+async def get_chat_member(chat_id, user_id):
+    return await single_flight(
+        ("get_chat_member", chat_id, user_id), app.get_chat_member, chat_id, user_id
+    )
+
+
+async def get_users(user_id):
+    return await single_flight(("get_users", user_id), app.get_users, user_id)
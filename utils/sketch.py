@@ -0,0 +1,57 @@
+import random
+from array import array
+from time import monotonic
+
+_PRIME = (1 << 61) - 1
+
+
+class DecayingCountMinSketch:
+    """Fixed-size approximate counter with exponential time decay.
+
+    Counts never undercount; hash collisions can only overestimate.
+    Every `half_life` seconds all counters are halved, so a key's count
+    tracks its recent rate: a steady r events/s settles between r and
+    2r events per half-life. Memory is `width * depth` floats however
+    many keys are seen.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4, half_life: float = 60.0):
+        self.width = width
+        self.depth = depth
+        self.half_life = half_life
+        rng = random.Random()
+        self._hashes = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(depth)
+        ]
+        self._rows = [array("f", [0.0]) * width for _ in range(depth)]
+        self._decayed_at = monotonic()
+
+    def _indexes(self, key: int):
+        width = self.width
+        return [((a * key + b) % _PRIME) % width for a, b in self._hashes]
+
+    def _decay(self, now: float):
+        halvings = int((now - self._decayed_at) // self.half_life)
+        if halvings <= 0:
+            return
+        self._decayed_at += halvings * self.half_life
+        if halvings >= 24:
+            self._rows = [array("f", [0.0]) * self.width for _ in range(self.depth)]
+            return
+        factor = 0.5 ** halvings
+        self._rows = [array("f", [count * factor for count in row]) for row in self._rows]
+
+    def add(self, key: int, now: float = None) -> float:
+        """Count one event for `key` and return its new estimate."""
+        self._decay(monotonic() if now is None else now)
+        cells = list(zip(self._rows, self._indexes(key)))
+        # Conservative update: only raise the counters that are at the minimum
+        estimate = min(row[index] for row, index in cells) + 1
+        for row, index in cells:
+            if row[index] < estimate:
+                row[index] = estimate
+        return estimate
+
+    def estimate(self, key: int, now: float = None) -> float:
+        self._decay(monotonic() if now is None else now)
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
@@ -0,0 +1,54 @@
+import unicodedata
+
+# Invisible characters dropped before matching
+_INVISIBLE = "\u00ad\u034f\u180e\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff"
+
+# Small-caps glyphs NFKC leaves alone
+_SMALL_CAPS = {
+    "ᴀ": "a", "ʙ": "b", "ᴄ": "c", "ᴅ": "d", "ᴇ": "e", "ꜰ": "f", "ɢ": "g",
+    "ʜ": "h", "ɪ": "i", "ᴊ": "j", "ᴋ": "k", "ʟ": "l", "ᴍ": "m", "ɴ": "n",
+    "ᴏ": "o", "ᴘ": "p", "ǫ": "q", "ʀ": "r", "ꜱ": "s", "ᴛ": "t", "ᴜ": "u",
+    "ᴠ": "v", "ᴡ": "w", "ʏ": "y", "ᴢ": "z",
+}
+
+# Lowercase Cyrillic/Greek letters that look like Latin ones
+_HOMOGLYPHS = {
+    "а": "a", "в": "b", "с": "c", "ԁ": "d", "е": "e", "ё": "e", "һ": "h",
+    "і": "i", "ї": "i", "ј": "j", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "ԛ": "q", "ѕ": "s", "т": "t", "у": "y", "х": "x", "ԝ": "w",
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v",
+    "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ɡ": "g", "ı": "i",
+}
+
+_FOLD_TABLE = str.maketrans({
+    **dict.fromkeys(_INVISIBLE),
+    **_SMALL_CAPS,
+    **_HOMOGLYPHS,
+})
+
+
+def fold_text(text: str) -> str:
+    """Reduce `text` to the canonical form blacklist entries are stored in.
+
+    NFKC turns fullwidth and styled letters into plain ones, casefold
+    handles case, and one translate pass strips invisible characters and
+    maps small caps and homoglyphs to Latin. Plain ASCII only needs lower().
+    """
+    if text.isascii():
+        return text.lower()
+    return unicodedata.normalize("NFKC", text).casefold().translate(_FOLD_TABLE)
+
+
+if __name__ == "__main__":
+    import timeit
+
+    samples = {
+        "ascii": "hey everyone, check out this totally normal message about cats",
+        "fullwidth": "ｈｅｙ ｅｖｅｒｙｏｎｅ, ｃｈｅｃｋ ｏｕｔ ｔｈｉｓ ｆｒｅｅ ｃｒｙｐｔｏ",
+        "small caps": "ʜᴇʏ ᴇᴠᴇʀʏᴏɴᴇ, ᴄʜᴇᴄᴋ ᴏᴜᴛ ᴛʜɪꜱ ꜰʀᴇᴇ ᴄʀʏᴘᴛᴏ",
+        "mixed": "hеy еvеryonе, chеck out this f\u200bree сrурtо giveaway",
+    }
+    runs = 100000
+    for name, text in samples.items():
+        seconds = timeit.timeit(lambda: fold_text(text), number=runs)
+        print(f"{name:>10}: {seconds / runs * 1e6:.2f} µs/message -> {fold_text(text)!r}")
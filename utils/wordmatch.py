@@ -0,0 +1,92 @@
+import re
+from collections import deque
+
+# Lists at least this long use the Aho-Corasick automaton
+AHO_CORASICK_MIN_WORDS = 100
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _is_boundary(text: str, pos: int) -> bool:
+    """Same test as the regex `\\b` at `pos`."""
+    before = pos > 0 and _is_word_char(text[pos - 1])
+    after = pos < len(text) and _is_word_char(text[pos])
+    return before != after
+
+
+class RegexMatcher:
+    """`\\b(w1|w2|...)\\b` as a single compiled pattern."""
+
+    def __init__(self, words):
+        self._pattern = re.compile(
+            r"\b(" + "|".join(re.escape(word) for word in words) + r")\b"
+        )
+
+    def search(self, text: str) -> bool:
+        return self._pattern.search(text) is not None
+
+
+class AhoCorasickMatcher:
+    """Finds any listed word in one pass over the text, however many words.
+
+    Matches only count when both ends sit on a word boundary, exactly as
+    with RegexMatcher.
+    """
+
+    def __init__(self, words):
+        goto = [{}]
+        lengths = [()]
+        for word in words:
+            if not word:
+                continue
+            node = 0
+            for char in word:
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = goto[node][char] = len(goto)
+                    goto.append({})
+                    lengths.append(())
+                node = nxt
+            lengths[node] += (len(word),)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                # Words ending at the fallback node also end here
+                lengths[child] += lengths[fail[child]]
+                queue.append(child)
+
+        self._goto = goto
+        self._fail = fail
+        self._lengths = lengths
+
+    def search(self, text: str) -> bool:
+        goto, fail, lengths = self._goto, self._fail, self._lengths
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if lengths[state] and _is_boundary(text, end):
+                for length in lengths[state]:
+                    if _is_boundary(text, end - length):
+                        return True
+        return False
+
+
+def compile_matcher(words):
+    """Build the cheapest matcher for `words`, or None if there are none."""
+    words = [word for word in words if word]
+    if not words:
+        return None
+    if len(words) < AHO_CORASICK_MIN_WORDS:
+        return RegexMatcher(words)
+    return AhoCorasickMatcher(words)